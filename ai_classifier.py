@@ -1,4 +1,16 @@
+import json
+import os
 import re
+import threading
+import time
+from datetime import datetime
+
+from config import get_env
+
+RULES_FILE = get_env("CLASSIFIER_RULES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "classifier_rules.json"))
+RULES_CHECK_SECONDS = 5
+
+# Built-in rules, used when classifier_rules.json is missing
 
 DEPARTMENT_EMAILS = {
     "PLUMBING": "swarajbehera923@gmail.com",
@@ -21,39 +33,254 @@ CATEGORY_KEYWORDS = {
     "FURNITURE": ["bed", "chair", "table", "furniture", "sofa", "desk", "cupboard", "drawer", "shelf", "couch", "furnishings", "fixture", "mattress", "wardrobe", "fitting", "cabinet", "stool", "bench", "dining", "furnishing", "upholstery"]
 }
 
-def extract_hostel_name(text):
+PRIORITY_KEYWORDS = {
+    "URGENT": ["urgent", "emergency"],
+    "HIGH": ["not working", "broken"]
+}
+
+# Priorities that can be matched by keyword, highest first; anything else is MEDIUM
+PRIORITY_LEVELS = ("URGENT", "HIGH")
+
+HOSTEL_PATTERNS = [
+
+    # KP-7, KP7, kp 7
+    r"\b(kp[\s\-]?\d+)\b",
+
+    # Block A, block c
+    r"\b(block[\s\-]?[a-z])\b",
+
+    # C Block, A Block
+    r"\b([a-z][\s\-]?block)\b",
+
+    # Kaveri Hostel, Ganga Hostel
+    r"\b([a-z]+\s+hostel)\b",
+
+    # Hostel KP-7, hostel kp7
+    r"\bhostel[\s\-]?([a-z0-9\-]+)\b"
+]
+
+
+def compile_patterns(patterns):
+    """Compile hostel-name regexes; raises ValueError on a bad pattern."""
+    if not isinstance(patterns, list) or not all(isinstance(p, str) for p in patterns):
+        raise ValueError("hostel_patterns must be a list of regexes")
+    compiled = []
+    for pattern in patterns:
+        try:
+            compiled.append(re.compile(pattern, re.IGNORECASE))
+        except re.error as e:
+            raise ValueError(f"Invalid hostel pattern {pattern!r}: {e}") from e
+    return compiled
+
+
+def compile_keywords(keywords, field):
     """
-    Extract hostel name from common formats like:
-    KP-7, KP7, Block A, C Block, Kaveri Hostel, etc.
+    Validate a {name: [keyword, ...]} mapping and lowercase the keywords,
+    since matching runs on lowercased text. Returns None for None.
     """
+    if keywords is None:
+        return None
+    if not isinstance(keywords, dict) or not all(
+        isinstance(kws, list) and all(isinstance(k, str) for k in kws) for kws in keywords.values()
+    ):
+        raise ValueError(f"{field} must map names to lists of keywords")
+    if field == "priority_keywords":
+        unknown = sorted(set(keywords) - set(PRIORITY_LEVELS))
+        if unknown:
+            raise ValueError(f"Unknown priorities {unknown}; expected {list(PRIORITY_LEVELS)}")
+    return {name: [k.lower() for k in kws] for name, kws in keywords.items()}
 
-    text_lower = text.lower()
 
-    patterns = [
+def check_department_emails(department_emails):
+    """Raise ValueError unless department_emails is None or maps categories to addresses."""
+    if department_emails is not None and not (
+        isinstance(department_emails, dict) and all(isinstance(e, str) for e in department_emails.values())
+    ):
+        raise ValueError("department_emails must map categories to email addresses")
+    return department_emails
 
-        # KP-7, KP7, kp 7
-        r"\b(kp[\s\-]?\d+)\b",
 
-        # Block A, block c
-        r"\b(block[\s\-]?[a-z])\b",
+class Classifier:
+    """
+    Keyword classifier compiled from one set of rules.
+    Each tenant (campus) gets its own instance; see tenants.py.
+    """
 
-        # C Block, A Block
-        r"\b([a-z][\s\-]?block)\b",
+    def __init__(self, category_keywords=None, department_emails=None, hostel_patterns=None, priority_keywords=None):
+        # Only missing rules fall back to the built-ins; an empty set is honoured
+        self.category_keywords = CATEGORY_KEYWORDS if category_keywords is None else category_keywords
+        self.department_emails = DEPARTMENT_EMAILS if department_emails is None else department_emails
+        self.priority_keywords = PRIORITY_KEYWORDS if priority_keywords is None else priority_keywords
+        self.hostel_patterns = compile_patterns(HOSTEL_PATTERNS if hostel_patterns is None else hostel_patterns)
 
-        # Kaveri Hostel, Ganga Hostel
-        r"\b([a-z]+\s+hostel)\b",
+    def extract_hostel_name(self, text):
+        """
+        Extract hostel name from common formats like:
+        KP-7, KP7, Block A, C Block, Kaveri Hostel, etc.
+        """
+        text_lower = text.lower()
 
-        # Hostel KP-7, hostel kp7
-        r"\bhostel[\s\-]?([a-z0-9\-]+)\b"
-    ]
+        for pattern in self.hostel_patterns:
+            match = pattern.search(text_lower)
+            if match:
+                hostel = match.group(1).upper().replace(" ", "")
+                return hostel
 
-    for pattern in patterns:
-        match = re.search(pattern, text_lower, re.IGNORECASE)
-        if match:
-            hostel = match.group(1).upper().replace(" ", "")
-            return hostel
+        return None
 
-    return None
+    def classify_category(self, text):
+        t = text.lower()
+        scores = {c: sum(1 for k in kws if k in t) for c, kws in self.category_keywords.items()}
+        return max(scores, key=scores.get) if any(scores.values()) else "OTHER"
+
+    def classify_priority(self, text):
+        t = text.lower()
+        for priority in PRIORITY_LEVELS:
+            if any(k in t for k in self.priority_keywords.get(priority, [])): return priority
+        return "MEDIUM"
+
+    def department_email(self, category):
+        return self.department_emails.get(category) or self.department_emails.get("OTHER") or DEPARTMENT_EMAILS["OTHER"]
+
+    def classify(self, message_text, image_url=None):
+        category = self.classify_category(message_text)
+        return {
+            "hostel_name": self.extract_hostel_name(message_text),
+            "room_number": extract_room_number(message_text),
+            "category": category,
+            "priority": self.classify_priority(message_text),
+            "summary": message_text[:100],
+            "department_email": self.department_email(category),
+            "confidence": 85.0
+        }
+
+
+class RuleSnapshot:
+    """An immutable, compiled version of the classifier rules."""
+
+    def __init__(self, version, classifier, compiled_at, compile_ms, source, mtime=None):
+        self.version = version
+        self.classifier = classifier
+        self.compiled_at = compiled_at
+        self.compile_ms = compile_ms
+        self.source = source
+        self.mtime = mtime
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "compiled_at": self.compiled_at,
+            "compile_ms": self.compile_ms,
+            "source": self.source,
+            "categories": sorted(self.classifier.category_keywords)
+        }
+
+
+def compile_rules(rules, source="builtin", mtime=None):
+    """Validate a rules dict and compile it into a RuleSnapshot."""
+    started = time.perf_counter()
+
+    if not isinstance(rules, dict):
+        raise ValueError("Rules must be a JSON object")
+    if "version" not in rules:
+        raise ValueError("Rules must have a version")
+
+    classifier = Classifier(
+        category_keywords=compile_keywords(rules.get("category_keywords"), "category_keywords"),
+        department_emails=check_department_emails(rules.get("department_emails")),
+        hostel_patterns=rules.get("hostel_patterns"),
+        priority_keywords=compile_keywords(rules.get("priority_keywords"), "priority_keywords")
+    )
+
+    return RuleSnapshot(
+        version=rules["version"],
+        classifier=classifier,
+        compiled_at=datetime.utcnow().isoformat(),
+        compile_ms=round((time.perf_counter() - started) * 1000, 3),
+        source=source,
+        mtime=mtime
+    )
+
+
+BUILTIN_RULES = {
+    "version": "builtin",
+    "category_keywords": CATEGORY_KEYWORDS,
+    "priority_keywords": PRIORITY_KEYWORDS,
+    "department_emails": DEPARTMENT_EMAILS
+}
+
+# Readers take one reference to the active snapshot and use it for the whole
+# classification; reload_rules() swaps in a new snapshot with a single assignment.
+_active_rules = None
+_rules_checked_at = 0.0
+_rules_lock = threading.Lock()
+
+
+def reload_rules(path=None):
+    """
+    Re-read and compile the rules file, then swap it in.
+    Raises (and keeps the current rules) if the file is invalid.
+    """
+    global _active_rules, _rules_checked_at
+    path = path or RULES_FILE
+
+    with _rules_lock:
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            snapshot = compile_rules(BUILTIN_RULES)
+        else:
+            with open(path) as f:
+                snapshot = compile_rules(json.load(f), source=path, mtime=mtime)
+
+        _active_rules = snapshot
+        _rules_checked_at = time.monotonic()
+
+    print(f"🧠 Classifier rules v{snapshot.version} compiled in {snapshot.compile_ms} ms")
+    return snapshot
+
+
+def active_rules():
+    """Return the current rule snapshot, picking up edits to the rules file."""
+    global _rules_checked_at
+    snapshot = _active_rules
+
+    if snapshot is None:
+        try:
+            return reload_rules()
+        except (OSError, ValueError) as e:
+            print(f"❌ Error loading classifier rules: {e}")
+            return _fallback_rules()
+
+    if time.monotonic() - _rules_checked_at >= RULES_CHECK_SECONDS:
+        _rules_checked_at = time.monotonic()
+        try:
+            mtime = os.stat(RULES_FILE).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != snapshot.mtime:
+            try:
+                snapshot = reload_rules()
+            except (OSError, ValueError) as e:
+                print(f"❌ Error reloading classifier rules, keeping v{snapshot.version}: {e}")
+
+    return snapshot
+
+
+def _fallback_rules():
+    global _active_rules
+    with _rules_lock:
+        if _active_rules is None:
+            _active_rules = compile_rules(BUILTIN_RULES)
+        return _active_rules
+
+
+def get_default_classifier():
+    return active_rules().classifier
+
+
+def extract_hostel_name(text):
+    return get_default_classifier().extract_hostel_name(text)
 
 def extract_room_number(text):
     """
@@ -90,23 +317,10 @@ def extract_room_number(text):
     return None
 
 def classify_category(text):
-    t = text.lower()
-    scores = {c: sum(1 for k in kws if k in t) for c, kws in CATEGORY_KEYWORDS.items()}
-    return max(scores, key=scores.get) if any(scores.values()) else "OTHER"
+    return get_default_classifier().classify_category(text)
 
 def classify_priority(text):
-    t = text.lower()
-    if any(k in t for k in ["urgent", "emergency"]): return "URGENT"
-    if any(k in t for k in ["not working", "broken"]): return "HIGH"
-    return "MEDIUM"
-
-def classify_complaint(message_text, image_url=None):
-    return {
-        "hostel_name": extract_hostel_name(message_text),
-        "room_number": extract_room_number(message_text),
-        "category": classify_category(message_text),
-        "priority": classify_priority(message_text),
-        "summary": message_text[:100],
-        "department_email": DEPARTMENT_EMAILS.get(classify_category(message_text), DEPARTMENT_EMAILS["OTHER"]),
-        "confidence": 85.0
-    }
\ No newline at end of file
+    return get_default_classifier().classify_priority(text)
+
+def classify_complaint(message_text, image_url=None, classifier=None):
+    return (classifier or get_default_classifier()).classify(message_text, image_url=image_url)
@@ -1,14 +1,11 @@
-from flask import Flask, request, jsonify, session, send_from_directory
+from flask import Flask, request, jsonify, session, abort, redirect, send_from_directory
 from flask_cors import CORS
-from twilio.twiml.messaging_response import MessagingResponse
-from dotenv import load_dotenv
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
-from datetime import datetime
 import time
-import random
 
+from config import get_env
 from database import (
-    supabase,
     check_student_exists,
     register_student,
     get_student_by_phone,
@@ -17,15 +14,42 @@ from database import (
     get_all_complaints,
     get_dashboard_stats,
     update_complaint_status,
-    get_complaint_by_token
+    get_complaint_by_token,
+    record_admin_login,
+    get_db_metrics,
+    DatabaseUnavailable
 )
-from ai_classifier import classify_complaint
+from ai_classifier import classify_complaint, active_rules, reload_rules
 from email_sender import send_department_email, send_whatsapp_notification
+from static_assets import AssetIndex
+from tenants import tenants
+from media import collect_media, get_storage
+from sla import get_sla_report
+import broadcast
+import profiling
+from auth import (
+    LoginBusy,
+    login_throttle,
+    check_password,
+    dummy_password_hash,
+    make_password_hash,
+    get_cached_admin,
+    get_cached_admin_by_id,
+    forget_admin
+)
+
+# The React build is served by the asset index below, not Flask's static folder
+app = Flask(__name__, static_folder=None)
+app.secret_key = get_env("SECRET_KEY", "fixxo-super-secret-key-change-in-production-2026")
 
-load_dotenv()
+# Render sits in front of the app; trust its X-Forwarded-For so login
+# throttling sees client IPs. Set PROXY_COUNT=0 when running without a proxy.
+proxy_count = int(get_env("PROXY_COUNT", 1))
+if proxy_count:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_count, x_proto=proxy_count)
 
-app = Flask(__name__)
-app.secret_key = os.getenv("SECRET_KEY", "fixxo-super-secret-key-change-in-production-2026")
+# Opt-in request profiling (PROFILING_ENABLED / PROFILE_TOKEN / SLOW_REQUEST_MS)
+profiling.init_app(app)
 
 # CORS Configuration
 CORS(app, 
@@ -35,22 +59,35 @@ CORS(app,
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 
 
+@app.errorhandler(DatabaseUnavailable)
+def database_unavailable(e):
+    """Fail fast with 503 while Supabase is slow or down."""
+    print(f"❌ Database unavailable: {e}")
+    return jsonify({"error": "Database temporarily unavailable. Please try again."}), 503, {"Retry-After": "5"}
+
+
 @app.route("/webhook", methods=["POST"])
 def webhook():
     """Handle incoming WhatsApp messages."""
+    from twilio.twiml.messaging_response import MessagingResponse
+
     resp = MessagingResponse()
     msg = resp.message()
     
     try:
         incoming_msg = request.values.get("Body", "").strip()
         from_number = request.values.get("From", "")
+        tenant = tenants.for_number(request.values.get("To", ""))
         
         print("=" * 60)
         print("📱 INCOMING WHATSAPP MESSAGE")
         print(f"From: {from_number}")
+        print(f"Tenant: {tenant.name}")
         print(f"Message: {incoming_msg}")
         
-        if not incoming_msg or not from_number:
+        num_media = int(request.values.get("NumMedia", 0) or 0)
+        
+        if (not incoming_msg and not num_media) or not from_number:
             print("❌ Missing message or phone number")
             msg.body("Invalid request. Please try again.")
             return str(resp)
@@ -60,7 +97,7 @@ def webhook():
         
         if not student:
             print(f"❌ Student not registered: {from_number}")
-            base_url = os.getenv("BASE_URL", "http://localhost:3000")
+            base_url = get_env("BASE_URL", "http://localhost:3000")
             phone = from_number.replace("whatsapp:+", "")
             registration_link = f"{base_url}/register?phone={phone}"
             
@@ -80,8 +117,17 @@ After registration, send your complaint again!""")
         print(f"   Hostel: {student.get('hostel_name', 'N/A')}")
         print(f"   Room: {student.get('room_number', 'N/A')}")
         
+        # Photos are stored before classifying; thumbnails render in the background
+        media = collect_media(request.values) if num_media else []
+        if media:
+            print(f"📷 {len(media)} photo(s) attached")
+        
         # Classify the complaint
-        classification = classify_complaint(incoming_msg)
+        classification = classify_complaint(
+            incoming_msg,
+            image_url=media[0]["url"] if media else None,
+            classifier=tenant.classifier
+        )
         print(f"🤖 AI Classification: {classification.get('category', 'OTHER')}")
         
         # Create complaint
@@ -96,7 +142,8 @@ After registration, send your complaint again!""")
             raw_message=incoming_msg,
             summary=classification['summary'],
             department_email=classification['department_email'],
-            confidence=classification['confidence']
+            confidence=classification['confidence'],
+            media=media
         )
         
         if not complaint:
@@ -193,6 +240,8 @@ def api_register():
         else:
             return jsonify({"error": "Registration failed"}), 500
             
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Registration error: {e}")
         import traceback
@@ -206,6 +255,11 @@ def require_admin(f):
     def decorated_function(*args, **kwargs):
         if "admin_id" not in session:
             return jsonify({"error": "Unauthorized"}), 401
+        # Deactivated admins lose access within ADMIN_CACHE_TTL seconds.
+        # Lookup errors propagate; a database outage must not log anyone out.
+        if not get_cached_admin_by_id(session["admin_id"]):
+            session.clear()
+            return jsonify({"error": "Unauthorized"}), 401
         return f(*args, **kwargs)
     decorated_function.__name__ = f.__name__
     return decorated_function
@@ -218,6 +272,7 @@ def admin_login():
         data = request.json
         username = data.get("username")
         password = data.get("password")
+        ip = request.remote_addr or "unknown"
         
         print("=" * 60)
         print("🔐 ADMIN LOGIN ATTEMPT")
@@ -226,23 +281,40 @@ def admin_login():
         if not username or not password:
             return jsonify({"error": "Username and password required"}), 400
         
-        response = supabase.table("admins").select("*").eq("username", username).eq("is_active", True).execute()
-            
-        if not response.data or len(response.data) == 0:
+        # Throttle before doing any hashing
+        retry_after = login_throttle.retry_after(username, ip)
+        if retry_after:
+            print(f"⛔ Login throttled for {username} from {ip}")
+            return jsonify({"error": "Too many failed attempts. Try again later."}), 429, {"Retry-After": str(retry_after)}
+        
+        # Lookup errors fall through to the 500/503 handlers and are not
+        # counted as failed attempts
+        admin = get_cached_admin(username)
+        
+        # Unknown usernames are checked against a dummy hash so they take
+        # as long to reject as a wrong password
+        stored_hash = admin['password_hash'] if admin else dummy_password_hash()
+        ok, needs_rehash = check_password(password, stored_hash)
+        if not admin or not ok:
+            login_throttle.record_failure(username, ip)
             return jsonify({"error": "Invalid credentials"}), 401
         
-        admin = response.data[0]
-        
-        if admin['password_hash'] != password:
-            return jsonify({"error": "Invalid credentials"}), 401
+        # Upgrade plaintext / old work-factor hashes on successful login.
+        # Best-effort: a busy hashing pool must not fail a correct login.
+        new_hash = None
+        if needs_rehash:
+            try:
+                new_hash = make_password_hash(password)
+            except (LoginBusy, TimeoutError) as e:
+                print(f"⚠️ Skipping password hash upgrade: {e or type(e).__name__}")
         
+        login_throttle.record_success(username, ip)
         session["admin_id"] = admin["id"]
         session["admin_username"] = admin["username"]
         
-        try:
-            supabase.table("admins").update({"last_login": datetime.utcnow().isoformat()}).eq("id", admin["id"]).execute()
-        except:
-            pass
+        record_admin_login(admin["id"], password_hash=new_hash)
+        if new_hash:
+            forget_admin(admin)
         
         print("✅ Login successful")
         print("=" * 60)
@@ -256,7 +328,14 @@ def admin_login():
                 "full_name": admin.get("full_name")
             }
         }), 200
+    
+    except LoginBusy:
+        print("⛔ Login rejected: password hashing pool is full")
+        print("=" * 60)
+        return jsonify({"error": "Server busy. Please try again."}), 503, {"Retry-After": "1"}
             
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Login error: {e}")
         print("=" * 60)
@@ -277,6 +356,8 @@ def admin_stats():
     try:
         stats = get_dashboard_stats()
         return jsonify(stats), 200
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -288,6 +369,8 @@ def admin_get_students():
     try:
         students = get_all_students()
         return jsonify(students), 200
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -295,11 +378,14 @@ def admin_get_students():
 @app.route("/api/admin/complaints", methods=["GET"])
 @require_admin
 def admin_get_complaints():
-    """Get all complaints."""
+    """Get all complaints (hot set; ?include_archived=1 adds archived ones)."""
     try:
         status = request.args.get("status")
-        complaints = get_all_complaints(status=status)
+        include_archived = request.args.get("include_archived", "").lower() in ("1", "true", "yes")
+        complaints = get_all_complaints(status=status, include_archived=include_archived)
         return jsonify(complaints), 200
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -326,10 +412,112 @@ def admin_update_complaint(complaint_id):
         
         return jsonify({"success": True, "complaint": complaint}), 200
             
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/admin/classifier", methods=["GET"])
+@require_admin
+def admin_classifier_rules():
+    """Get the active classifier rule version."""
+    return jsonify(active_rules().to_dict()), 200
+
+
+@app.route("/api/admin/classifier/reload", methods=["POST"])
+@require_admin
+def admin_reload_classifier_rules():
+    """Reload classifier rules from the rules file without a restart."""
+    try:
+        snapshot = reload_rules()
+        print(f"🔄 Classifier rules reloaded by {session.get('admin_username', 'Admin')}")
+        return jsonify({"success": True, "rules": snapshot.to_dict()}), 200
+    except (OSError, ValueError) as e:
+        return jsonify({"error": f"Rules not reloaded: {e}", "rules": active_rules().to_dict()}), 400
+
+
+@app.route("/api/admin/metrics/db", methods=["GET"])
+@require_admin
+def admin_db_metrics():
+    """Get database pool, call and circuit breaker metrics."""
+    return jsonify(get_db_metrics()), 200
+
+
+@app.route("/api/admin/sla", methods=["GET"])
+@require_admin
+def admin_sla():
+    """Get resolution-time percentiles per category, hostel and department."""
+    return jsonify(get_sla_report()), 200
+
+
+@app.route("/api/admin/broadcast", methods=["POST"])
+@require_admin
+def admin_broadcast():
+    """Send a WhatsApp announcement to every student in a hostel (or room range)."""
+    try:
+        data = request.json or {}
+        hostel_name = data.get("hostel_name")
+        message = (data.get("message") or "").strip()
+        
+        if not hostel_name or not message:
+            return jsonify({"error": "hostel_name and message required"}), 400
+        if len(message) > broadcast.MAX_MESSAGE_LENGTH:
+            return jsonify({"error": f"Message longer than {broadcast.MAX_MESSAGE_LENGTH} characters"}), 400
+        
+        try:
+            room_from = int(data["room_from"]) if data.get("room_from") not in (None, "") else None
+            room_to = int(data["room_to"]) if data.get("room_to") not in (None, "") else None
+        except ValueError:
+            return jsonify({"error": "room_from and room_to must be numbers"}), 400
+        if room_from is not None and room_to is not None and room_from > room_to:
+            return jsonify({"error": "room_from must not be greater than room_to"}), 400
+        
+        if data.get("dry_run"):
+            recipients = broadcast.select_recipients(hostel_name, room_from, room_to)
+            return jsonify({"recipients": len(recipients)}), 200
+        
+        job = broadcast.start_broadcast(
+            hostel_name=hostel_name,
+            message=message,
+            created_by=session.get("admin_username", "Admin"),
+            room_from=room_from,
+            room_to=room_to
+        )
+        return jsonify({"success": True, "broadcast": job}), 202
+    
+    except DatabaseUnavailable:
+        raise
+    except Exception as e:
+        print(f"❌ Broadcast error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/admin/broadcast/<broadcast_id>", methods=["GET"])
+@require_admin
+def admin_broadcast_progress(broadcast_id):
+    """Get delivery progress of a broadcast."""
+    progress = broadcast.get_progress(broadcast_id)
+    if not progress:
+        return jsonify({"error": "Broadcast not found"}), 404
+    return jsonify(progress), 200
+
+
+@app.route("/api/admin/broadcast/<broadcast_id>/resume", methods=["POST"])
+@require_admin
+def admin_broadcast_resume(broadcast_id):
+    """Resume an interrupted broadcast (?retry_failed=1 also retries failed deliveries)."""
+    retry_failed = request.args.get("retry_failed", "").lower() in ("1", "true", "yes")
+    progress = broadcast.get_progress(broadcast_id)
+    if not progress:
+        return jsonify({"error": "Broadcast not found"}), 404
+    if progress.get("status") == "FAILED":
+        return jsonify({"error": "Broadcast was not fully created; start a new one"}), 409
+    if not broadcast.resume_broadcast(broadcast_id, retry_failed=retry_failed):
+        return jsonify({"error": "Broadcast is already running"}), 409
+    return jsonify({"success": True}), 202
+
+
 @app.route("/resolve", methods=["GET"])
 def resolve_complaint():
     """Resolve complaint via email link."""
@@ -372,42 +560,70 @@ def resolve_complaint():
 <p style="color: #10b981; font-weight: bold;">✅ Student has been notified via WhatsApp</p>
 </div></body></html>"""
         
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Resolution error: {e}")
         return f"❌ Error: {str(e)}", 500
 
 
+# === COMPLAINT PHOTOS ===
+# Files are content-addressed, so they never change once written.
+
+@app.route('/media/<name>')
+def serve_media(name):
+    """Serve an original complaint photo."""
+    response = send_from_directory(get_storage().originals_dir, name)
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+@app.route('/media/thumbs/<name>')
+def serve_media_thumbnail(name):
+    """
+    Serve a photo thumbnail, or redirect to the original while it is still rendering.
+    `name` is the original's file name, so no directory lookup is needed.
+    """
+    storage = get_storage()
+    digest = name.split(".", 1)[0]
+    thumb_path = storage.thumbnail_path(digest)
+    if os.path.exists(thumb_path):
+        response = send_from_directory(storage.thumbs_dir, os.path.basename(thumb_path))
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+    
+    if not os.path.exists(storage.original_path(os.path.basename(name))):
+        abort(404)
+    response = redirect(f"/media/{name}", code=302)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
 # === REACT FRONTEND SERVING ===
 # This MUST be at the end, after all API routes!
 
+assets = AssetIndex(os.path.join(app.root_path, 'build'))
+
+
 @app.route('/static/<path:filename>')
 def serve_static_files(filename):
-    """Serve static files (CSS, JS, images) from React build."""
-    return send_from_directory(os.path.join(app.root_path, 'build', 'static'), filename)
+    """Serve hashed static files (CSS, JS, images) from the React build index."""
+    response = assets.serve(f"static/{filename}")
+    if response is None:
+        abort(404)
+    return response
 
 
 @app.route('/favicon.ico')
-def favicon():
-    """Serve favicon."""
-    return send_from_directory(os.path.join(app.root_path, 'build'), 'favicon.ico')
-
-
 @app.route('/manifest.json')
-def manifest():
-    """Serve manifest."""
-    return send_from_directory(os.path.join(app.root_path, 'build'), 'manifest.json')
-
-
 @app.route('/logo192.png')
-def logo192():
-    """Serve logo."""
-    return send_from_directory(os.path.join(app.root_path, 'build'), 'logo192.png')
-
-
 @app.route('/logo512.png')
-def logo512():
-    """Serve logo."""
-    return send_from_directory(os.path.join(app.root_path, 'build'), 'logo512.png')
+def serve_build_file():
+    """Serve favicon, manifest and logos."""
+    response = assets.serve(request.path.lstrip('/'))
+    if response is None:
+        abort(404)
+    return response
 
 
 # Catch-all route - MUST be absolute last!
@@ -428,15 +644,17 @@ def serve_react_app(path):
     if path.startswith('resolve'):
         return jsonify({"error": "Invalid resolution link"}), 404
     
-    # Check if it's a static file request
-    file_path = os.path.join(app.root_path, 'build', path)
-    if path and os.path.isfile(file_path):
-        return send_from_directory(os.path.join(app.root_path, 'build'), path)
+    # Files from the build are looked up in the index, never on disk
+    if path and path in assets:
+        return assets.serve(path)
     
     # Otherwise, serve index.html for React Router to handle
-    return send_from_directory(os.path.join(app.root_path, 'build'), 'index.html')
+    response = assets.serve('index.html')
+    if response is None:
+        abort(404)
+    return response
 
 
 if __name__ == "__main__":
-    port = int(os.getenv("PORT", 5000))
+    port = int(get_env("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1,216 @@
+"""
+Archive old resolved complaints out of the hot `complaints` table.
+
+Complaints resolved more than ARCHIVE_AFTER_DAYS ago are written to
+gzip-compressed NDJSON files (one JSON row per line, grouped by the
+month they were resolved) and then deleted from Supabase. Each batch
+gets its own file, so earlier archives are never reopened for writing:
+
+    archive/complaints-2026-01.20261019T020000-1234-0001.ndjson.gz
+    archive/index.json          # archived row counts per month
+
+A batch file is written under a temp name, fsynced, renamed into place
+and fsynced again before its rows are deleted, so an interrupted run can
+only leave duplicates behind, never lose data; readers skip duplicate
+ids and stop cleanly at a damaged file's last complete row.
+
+Rows are deleted from Supabase once archived, so ARCHIVE_DIR must be set
+explicitly to storage that outlives the job and that the web process can
+read too (on Render: a persistent disk mounted on both services, not the
+cron job's own ephemeral disk). Without it the job refuses to delete
+anything; --dry-run still works.
+
+Run it from cron:
+    ARCHIVE_DIR=/var/data/archive python archive.py --days 180
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import zlib
+from datetime import datetime, timedelta
+
+from config import get_env
+
+# Set explicitly when the archive lives on durable, shared storage
+ARCHIVE_DIR_CONFIGURED = bool(get_env("ARCHIVE_DIR"))
+ARCHIVE_DIR = get_env("ARCHIVE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")
+ARCHIVE_AFTER_DAYS = int(get_env("ARCHIVE_AFTER_DAYS", 180))
+BATCH_SIZE = 500
+
+_index_lock = threading.Lock()
+
+
+FILE_PREFIX = "complaints-"
+FILE_SUFFIX = ".ndjson.gz"
+
+
+def _write_batch_file(month, rows, run_id, batch_number):
+    """Durably write one batch of rows to a new archive file."""
+    name = f"{FILE_PREFIX}{month}.{run_id}-{batch_number:04d}{FILE_SUFFIX}"
+    final_path = os.path.join(ARCHIVE_DIR, name)
+    tmp_path = f"{final_path}.tmp"
+
+    with open(tmp_path, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            for row in rows:
+                f.write((json.dumps(row, separators=(",", ":")) + "\n").encode("utf-8"))
+        # The gzip trailer is written on close; sync only after it
+        raw.flush()
+        os.fsync(raw.fileno())
+
+    os.replace(tmp_path, final_path)
+    _fsync_dir(ARCHIVE_DIR)
+    return name
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _index_path():
+    return os.path.join(ARCHIVE_DIR, "index.json")
+
+
+def load_index():
+    """Archived row counts per month, e.g. {"2026-01": 412}."""
+    try:
+        with open(_index_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(index):
+    tmp_path = f"{_index_path()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, _index_path())
+
+
+def archived_count():
+    return sum(load_index().values())
+
+
+def archive_resolved(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=BATCH_SIZE, dry_run=False):
+    """Move complaints resolved before the cutoff into the monthly archive. Returns rows moved."""
+    from database import get_resolved_complaints_before, delete_complaints
+
+    if not dry_run and not ARCHIVE_DIR_CONFIGURED:
+        raise RuntimeError(
+            "ARCHIVE_DIR is not set; refusing to delete complaints into the app directory, "
+            "which may not outlive this job. Point it at storage shared with the web service."
+        )
+
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).isoformat()
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    run_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    batch_number = 0
+    moved = 0
+
+    print(f"🗄️ Archiving complaints resolved before {cutoff}")
+    while True:
+        rows = get_resolved_complaints_before(cutoff, limit=batch_size)
+        if not rows:
+            break
+
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(row["resolved_at"][:7], []).append(row)
+
+        if dry_run:
+            for month, month_rows in sorted(by_month.items()):
+                print(f"   {month}: {len(month_rows)} complaint(s) would be archived")
+            return len(rows)
+
+        batch_number += 1
+        for month, month_rows in by_month.items():
+            _write_batch_file(month, month_rows, run_id, batch_number)
+
+        delete_complaints([row["id"] for row in rows])
+
+        with _index_lock:
+            index = load_index()
+            for month, month_rows in by_month.items():
+                index[month] = index.get(month, 0) + len(month_rows)
+            _save_index(index)
+
+        moved += len(rows)
+        print(f"   Archived {moved} complaint(s) so far")
+
+        if len(rows) < batch_size:
+            break
+
+    print(f"✅ Archived {moved} complaint(s)")
+    return moved
+
+
+def _archive_files():
+    """(month, file name) pairs, newest month first."""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    files = [
+        (name[len(FILE_PREFIX):len(FILE_PREFIX) + 7], name)
+        for name in os.listdir(ARCHIVE_DIR)
+        if name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX)
+    ]
+    return sorted(files, reverse=True)
+
+
+def _read_file(path):
+    """Yield rows from one archive file, stopping at a truncated or corrupt tail."""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+    except (EOFError, OSError, zlib.error, ValueError) as e:
+        print(f"⚠️ Archive file {os.path.basename(path)} is damaged, read up to the error: {e}")
+
+
+def iter_archived(months=None):
+    """Yield archived complaints, newest month first, skipping duplicate ids."""
+    seen = set()
+    for month, name in _archive_files():
+        if months and month not in months:
+            continue
+        for row in _read_file(os.path.join(ARCHIVE_DIR, name)):
+            if row["id"] in seen:
+                continue
+            seen.add(row["id"])
+            yield row
+
+
+def get_archived_complaints(status=None):
+    """Archived complaints, newest first. Archived rows are always RESOLVED."""
+    if status and status != "RESOLVED":
+        return []
+    rows = list(iter_archived())
+    rows.sort(key=lambda row: row.get("created_at") or "", reverse=True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old resolved complaints.")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="archive complaints resolved more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="only report the first batch")
+    args = parser.parse_args()
+    try:
+        archive_resolved(older_than_days=args.days, batch_size=args.batch_size, dry_run=args.dry_run)
+    except RuntimeError as e:
+        sys.exit(f"❌ {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Admin authentication helpers.
+
+- Passwords are stored as PBKDF2-SHA256 hashes with a tunable iteration
+  count (PASSWORD_HASH_ITERATIONS). Legacy plaintext values still verify
+  and are re-hashed on the next successful login.
+- Hashing runs in a small, bounded thread pool so a burst of login
+  attempts can only use PASSWORD_HASH_WORKERS cores; extra attempts are
+  turned away instead of queueing behind each other.
+- Active admin records are cached for a few seconds, and failed logins
+  are throttled per username+IP and per IP before any hashing happens.
+
+Create a hash for the admins table with:
+    python auth.py hash
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import get_env
+
+HASH_ALGORITHM = "pbkdf2_sha256"
+PASSWORD_HASH_ITERATIONS = int(get_env("PASSWORD_HASH_ITERATIONS", 600000))
+PASSWORD_HASH_WORKERS = int(get_env("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_TIMEOUT = 10
+
+ADMIN_CACHE_TTL = int(get_env("ADMIN_CACHE_TTL", 30))
+
+LOGIN_WINDOW_SECONDS = 15 * 60
+MAX_FAILURES_PER_USER_IP = 5
+MAX_FAILURES_PER_IP = 20
+
+
+class LoginBusy(Exception):
+    """Raised when the password hashing pool is saturated."""
+
+
+class TTLCache:
+    """A small thread-safe cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if len(self._data) >= self.max_entries:
+                self._evict()
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._data.items() if expires_at < now]:
+            del self._data[key]
+        # Still full: drop the oldest entries (dicts keep insertion order)
+        while len(self._data) >= self.max_entries:
+            del self._data[next(iter(self._data))]
+
+
+# === PASSWORD HASHING ===
+
+def hash_password(password, iterations=None):
+    """Hash a password as pbkdf2_sha256$<iterations>$<salt>$<hash>."""
+    iterations = iterations or PASSWORD_HASH_ITERATIONS
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return "$".join([
+        HASH_ALGORITHM,
+        str(iterations),
+        base64.b64encode(salt).decode(),
+        base64.b64encode(digest).decode()
+    ])
+
+
+def verify_password(password, stored_hash):
+    """
+    Check a password against a stored value.
+    Returns (ok, needs_rehash).
+    """
+    if not stored_hash:
+        return False, False
+
+    parts = stored_hash.split("$")
+    if len(parts) != 4 or parts[0] != HASH_ALGORITHM:
+        # Legacy plaintext value
+        ok = hmac.compare_digest(stored_hash.encode(), password.encode())
+        return ok, ok
+
+    _, iterations, salt, expected = parts
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), base64.b64decode(salt), int(iterations))
+    ok = hmac.compare_digest(digest, base64.b64decode(expected))
+    return ok, ok and int(iterations) != PASSWORD_HASH_ITERATIONS
+
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+# Running + queued hash jobs; beyond this, logins are rejected with LoginBusy
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS * 4)
+
+
+def _get_hash_pool():
+    global _hash_pool
+    if _hash_pool is None:
+        with _hash_pool_lock:
+            if _hash_pool is None:
+                _hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+    return _hash_pool
+
+
+def _run_in_hash_pool(fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        raise LoginBusy("Too many login attempts in progress")
+    try:
+        future = _get_hash_pool().submit(fn, *args)
+    except BaseException:
+        _hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+
+
+def check_password(password, stored_hash):
+    """verify_password() on the hashing pool. Returns (ok, needs_rehash)."""
+    return _run_in_hash_pool(verify_password, password, stored_hash)
+
+
+def make_password_hash(password):
+    """hash_password() on the hashing pool."""
+    return _run_in_hash_pool(hash_password, password)
+
+
+_dummy_hash = None
+
+
+def dummy_password_hash():
+    """
+    A hash of a random password at the current work factor. Checked for
+    unknown usernames so they take as long to reject as wrong passwords.
+    """
+    global _dummy_hash
+    if _dummy_hash is None:
+        with _hash_pool_lock:
+            if _dummy_hash is None:
+                _dummy_hash = hash_password(base64.b64encode(os.urandom(16)).decode())
+    return _dummy_hash
+
+
+# === LOGIN THROTTLE ===
+
+class LoginThrottle:
+    """Counts failed logins in a sliding window per username+IP and per IP."""
+
+    def __init__(self, window=LOGIN_WINDOW_SECONDS, max_keys=10000):
+        self.window = window
+        self.max_keys = max_keys
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def _recent(self, key, now):
+        attempts = [t for t in self._failures.get(key, []) if now - t < self.window]
+        if attempts:
+            self._failures[key] = attempts
+        else:
+            self._failures.pop(key, None)
+        return attempts
+
+    def retry_after(self, username, ip):
+        """Seconds until this username/IP may try again, or 0 if allowed."""
+        now = time.monotonic()
+        with self._lock:
+            waits = []
+            for key, limit in ((f"user:{username.lower()}|{ip}", MAX_FAILURES_PER_USER_IP), (f"ip:{ip}", MAX_FAILURES_PER_IP)):
+                attempts = self._recent(key, now)
+                if len(attempts) >= limit:
+                    waits.append(attempts[-limit] + self.window - now)
+            return int(max(waits)) + 1 if waits else 0
+
+    def record_failure(self, username, ip):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._failures) >= self.max_keys:
+                for key in list(self._failures):
+                    self._recent(key, now)
+                while len(self._failures) >= self.max_keys:
+                    del self._failures[next(iter(self._failures))]
+            for key in (f"user:{username.lower()}|{ip}", f"ip:{ip}"):
+                self._failures.setdefault(key, []).append(now)
+
+    def record_success(self, username, ip):
+        with self._lock:
+            self._failures.pop(f"user:{username.lower()}|{ip}", None)
+
+
+login_throttle = LoginThrottle()
+
+
+# === ADMIN LOOKUPS ===
+
+_admins_by_username = TTLCache(ttl=ADMIN_CACHE_TTL)
+_admins_by_id = TTLCache(ttl=ADMIN_CACHE_TTL)
+_MISSING = object()
+
+
+def get_cached_admin(username):
+    """
+    Active admin by username, cached for ADMIN_CACHE_TTL seconds (misses too).
+    Lookup errors propagate and are not cached.
+    """
+    from database import get_active_admin
+
+    admin = _admins_by_username.get(username, _MISSING)
+    if admin is _MISSING:
+        admin = get_active_admin(username)
+        _admins_by_username.set(username, admin)
+        if admin:
+            _admins_by_id.set(admin["id"], admin)
+    return admin
+
+
+def get_cached_admin_by_id(admin_id):
+    """
+    Active admin by id, cached for ADMIN_CACHE_TTL seconds (misses too).
+    Lookup errors propagate and are not cached.
+    """
+    from database import get_active_admin_by_id
+
+    admin = _admins_by_id.get(admin_id, _MISSING)
+    if admin is _MISSING:
+        admin = get_active_admin_by_id(admin_id)
+        _admins_by_id.set(admin_id, admin)
+    return admin
+
+
+def forget_admin(admin):
+    """Drop an admin from the caches after their record changes."""
+    _admins_by_username.delete(admin["username"])
+    _admins_by_id.delete(admin["id"])
+
+
+if __name__ == "__main__":
+    import getpass
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] != "hash":
+        sys.exit("Usage: python auth.py hash")
+    password = getpass.getpass("Password: ")
+    if password != getpass.getpass("Confirm: "):
+        sys.exit("❌ Passwords do not match")
+    print(hash_password(password))
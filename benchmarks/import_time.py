@@ -0,0 +1,73 @@
+"""
+Measure how long `import app` takes using `python -X importtime`.
+
+Usage:
+    python benchmarks/import_time.py [--module app] [--budget-ms 400] [--top 15]
+
+Exits non-zero when the cumulative import time of the module exceeds the
+budget, or when a heavy client library (supabase, twilio, resend) is
+imported eagerly.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# These must only be imported on first use, never at import time.
+LAZY_MODULES = ("supabase", "twilio", "resend")
+
+
+def measure(module):
+    """Import `module` in a fresh interpreter and return (name, self_us, cumulative_us) rows."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        raise SystemExit(f"❌ import {module} failed")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", 400)))
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    rows = measure(args.module)
+    total_ms = next((cum for name, _, cum in rows if name == args.module), 0) / 1000
+
+    print(f"Slowest imports for `{args.module}`:")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  (self {self_us / 1000:6.1f} ms)  {name}")
+
+    failed = False
+    eager = sorted({name.split(".")[0] for name, _, _ in rows} & set(LAZY_MODULES))
+    if eager:
+        print(f"❌ Imported eagerly: {', '.join(eager)}")
+        failed = True
+
+    if total_ms > args.budget_ms:
+        print(f"❌ import {args.module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+        failed = True
+    else:
+        print(f"✅ import {args.module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+Hostel-wide WhatsApp announcements.
+
+A broadcast picks students by hostel (and optionally a room range),
+stores one delivery row per recipient, then fans out through a small
+worker pool. Sends are paced by a shared token bucket so we stay under
+Twilio's per-sender throughput (TWILIO_MESSAGES_PER_SECOND).
+
+Every recipient's state (PENDING / SENT / FAILED) is written back as it
+happens, so a job interrupted by a restart can be resumed and only the
+remaining recipients are messaged. A job is claimed in the database
+before sending, so only one worker sends it at a time.
+
+The token bucket is per process: TWILIO_MESSAGES_PER_SECOND should be
+the sender's limit divided by the number of workers that may run
+broadcasts at the same time.
+"""
+import os
+import re
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from config import get_env
+from resilience import RateLimiter, backoff_delay
+
+MESSAGES_PER_SECOND = float(get_env("TWILIO_MESSAGES_PER_SECOND", 10))
+BROADCAST_WORKERS = int(get_env("BROADCAST_WORKERS", 4))
+MAX_SEND_ATTEMPTS = 3
+MAX_MESSAGE_LENGTH = 1500
+
+# A job is owned by one worker at a time through a lease on its row; a
+# worker that dies stops renewing, and the job can be resumed elsewhere.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+CLAIM_LEASE_SECONDS = 120
+CLAIM_RENEW_SECONDS = 30
+
+# Twilio error codes worth retrying: too many requests / queue overflow
+RETRYABLE_TWILIO_CODES = (20429, 30001)
+
+_limiter = RateLimiter(MESSAGES_PER_SECOND, burst=max(1, int(MESSAGES_PER_SECOND)))
+_running = set()
+_running_lock = threading.Lock()
+
+
+def room_in_range(room_number, room_from=None, room_to=None):
+    """Compare the numeric part of a room like '312' or 'A-312' against an inclusive range."""
+    if room_from is None and room_to is None:
+        return True
+    match = re.search(r"\d+", str(room_number or ""))
+    if not match:
+        return False
+    room = int(match.group())
+    return (room_from is None or room >= room_from) and (room_to is None or room <= room_to)
+
+
+def select_recipients(hostel_name, room_from=None, room_to=None):
+    """Students in a hostel, optionally within a room range."""
+    from database import get_students_by_hostel
+
+    return [
+        student for student in get_students_by_hostel(hostel_name)
+        if student.get("phone_number") and room_in_range(student.get("room_number"), room_from, room_to)
+    ]
+
+
+def start_broadcast(hostel_name, message, created_by, room_from=None, room_to=None):
+    """Create a broadcast job and start sending in the background."""
+    from database import create_broadcast
+
+    recipients = select_recipients(hostel_name, room_from, room_to)
+    broadcast = create_broadcast(hostel_name, room_from, room_to, message, created_by, recipients)
+    print(f"📣 Broadcast #{broadcast['id']} created for {len(recipients)} student(s) in {hostel_name}")
+    resume_broadcast(broadcast["id"])
+    return broadcast
+
+
+def resume_broadcast(broadcast_id, retry_failed=False):
+    """
+    Send to every recipient still PENDING (and FAILED, if asked).
+    Returns False if the job is already being sent by this or another worker.
+    """
+    from database import claim_broadcast
+
+    with _running_lock:
+        if broadcast_id in _running:
+            return False
+        _running.add(broadcast_id)
+
+    try:
+        claimed = claim_broadcast(broadcast_id, WORKER_ID, CLAIM_LEASE_SECONDS)
+    except BaseException:
+        with _running_lock:
+            _running.discard(broadcast_id)
+        raise
+    if not claimed:
+        with _running_lock:
+            _running.discard(broadcast_id)
+        return False
+
+    thread = threading.Thread(
+        target=_run,
+        args=(broadcast_id, retry_failed),
+        name=f"broadcast-{broadcast_id}",
+        daemon=True
+    )
+    thread.start()
+    return True
+
+
+def is_running(broadcast_id):
+    with _running_lock:
+        return broadcast_id in _running
+
+
+class _LostClaim(Exception):
+    """Another worker took over the broadcast after our lease expired."""
+
+
+def _run(broadcast_id, retry_failed):
+    from database import get_broadcast, get_broadcast_recipients, update_broadcast, renew_broadcast_claim
+
+    stop = threading.Event()
+    try:
+        broadcast = get_broadcast(broadcast_id)
+        if not broadcast:
+            print(f"❌ Broadcast #{broadcast_id} not found")
+            return
+
+        statuses = ("PENDING", "FAILED") if retry_failed else ("PENDING",)
+        recipients = get_broadcast_recipients(broadcast_id, statuses=statuses)
+        print(f"📣 Broadcast #{broadcast_id}: sending to {len(recipients)} recipient(s)")
+
+        with ThreadPoolExecutor(max_workers=BROADCAST_WORKERS, thread_name_prefix=f"broadcast-{broadcast_id}") as pool:
+            futures = [pool.submit(_deliver, recipient, broadcast["message"], stop) for recipient in recipients]
+            renewed_at = time.monotonic()
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    if time.monotonic() - renewed_at >= CLAIM_RENEW_SECONDS:
+                        if not renew_broadcast_claim(broadcast_id, WORKER_ID):
+                            raise _LostClaim("claimed by another worker")
+                        renewed_at = time.monotonic()
+            except BaseException:
+                # Stop queued sends before leaving the pool
+                stop.set()
+                for future in futures:
+                    future.cancel()
+                raise
+
+        update_broadcast(broadcast_id, status="COMPLETED", finished_at=datetime.utcnow().isoformat(), claimed_by=None)
+        print(f"✅ Broadcast #{broadcast_id} completed")
+    except _LostClaim as e:
+        print(f"⚠️ Broadcast #{broadcast_id} stopped: {e}")
+    except Exception as e:
+        # Recipients keep their state; the job can be resumed
+        print(f"❌ Broadcast #{broadcast_id} stopped: {e}")
+        try:
+            update_broadcast(broadcast_id, status="INTERRUPTED", claimed_by=None)
+        except Exception:
+            pass
+    finally:
+        with _running_lock:
+            _running.discard(broadcast_id)
+
+
+def _deliver(recipient, message, stop):
+    """
+    Send to one recipient and record the outcome.
+    Only Twilio errors count as delivery failures; if the outcome cannot
+    be recorded the error propagates and the whole job stops, so a resume
+    never re-sends to someone marked FAILED after a successful send.
+    """
+    from database import update_broadcast_recipient
+    from email_sender import send_whatsapp_message
+
+    attempts = recipient.get("attempts") or 0
+    error = None
+    for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+        if stop.is_set():
+            return None
+        _limiter.acquire()
+        attempts += 1
+        try:
+            sid = send_whatsapp_message(recipient["phone_number"], message)
+        except Exception as e:
+            error = str(e)
+            if getattr(e, "code", None) not in RETRYABLE_TWILIO_CODES:
+                break
+            time.sleep(backoff_delay(attempt, base=0.5, cap=10))
+            continue
+
+        try:
+            update_broadcast_recipient(recipient["id"], status="SENT", message_sid=sid, attempts=attempts, error=None)
+        except Exception:
+            print(f"❌ Sent {sid} to {recipient['phone_number']} but could not record it; stopping broadcast")
+            raise
+        return True
+
+    print(f"❌ Broadcast delivery to {recipient['phone_number']} failed: {error}")
+    update_broadcast_recipient(recipient["id"], status="FAILED", attempts=attempts, error=error[:500])
+    return False
+
+
+def get_progress(broadcast_id):
+    """Broadcast job with per-status recipient counts, or None."""
+    from database import get_broadcast, count_broadcast_recipients
+
+    broadcast = get_broadcast(broadcast_id)
+    if not broadcast:
+        return None
+
+    counts = count_broadcast_recipients(broadcast_id)
+    total = broadcast.get("total") or sum(counts.values())
+    done = counts["SENT"] + counts["FAILED"]
+    return {
+        **broadcast,
+        "counts": counts,
+        "percent_complete": round(100 * done / total, 1) if total else 100.0,
+        "running": is_running(broadcast_id)
+    }
@@ -0,0 +1,24 @@
+import os
+import threading
+
+_env_loaded = False
+_env_lock = threading.Lock()
+
+
+def load_env():
+    """Load variables from .env once per process."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _env_lock:
+        if _env_loaded:
+            return
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+
+def get_env(name, default=None):
+    """Read an environment variable, loading .env on first use."""
+    load_env()
+    return os.getenv(name, default)
@@ -1,41 +1,206 @@
-from supabase import create_client
-import os
-from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
+import threading
+import time
 import uuid
 
-load_dotenv()
+from config import get_env
+from profiling import traced
+from resilience import CircuitBreaker, CircuitOpenError, backoff_delay
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Per HTTP request to Supabase
+DB_TIMEOUT_SECONDS = float(get_env("DB_TIMEOUT_SECONDS", 5))
+# Whole call, including retries; a retry is only started if it can time
+# out before the deadline
+DB_DEADLINE_SECONDS = float(get_env("DB_DEADLINE_SECONDS", 8))
+DB_MAX_CONNECTIONS = int(get_env("DB_MAX_CONNECTIONS", 10))
+DB_MAX_KEEPALIVE = int(get_env("DB_MAX_KEEPALIVE", 5))
+DB_READ_RETRIES = 2
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+_supabase = None
+_supabase_lock = threading.Lock()
 
+breaker = CircuitBreaker(
+    "supabase",
+    failure_threshold=int(get_env("DB_BREAKER_THRESHOLD", 5)),
+    reset_timeout=float(get_env("DB_BREAKER_RESET_SECONDS", 30))
+)
 
+
+class DatabaseUnavailable(Exception):
+    """Supabase could not be reached in time, or the circuit is open."""
+
+
+class _Metrics:
+    def __init__(self):
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finish(self, name, outcome, seconds):
+        with self._lock:
+            self.in_flight -= 1
+            stats = self.calls.setdefault(name, {"ok": 0, "error": 0, "retries": 0, "total_ms": 0.0})
+            stats[outcome] += 1
+            stats["total_ms"] += seconds * 1000
+
+    def retried(self, name):
+        with self._lock:
+            self.calls.setdefault(name, {"ok": 0, "error": 0, "retries": 0, "total_ms": 0.0})["retries"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "calls": {
+                    name: dict(stats, avg_ms=round(stats["total_ms"] / max(1, stats["ok"] + stats["error"]), 1))
+                    for name, stats in self.calls.items()
+                }
+            }
+
+
+_metrics = _Metrics()
+
+
+def get_supabase():
+    """Return the process-wide Supabase client, creating it on first use."""
+    global _supabase
+    if _supabase is None:
+        with _supabase_lock:
+            if _supabase is None:
+                _supabase = _create_client()
+    return _supabase
+
+
+def _create_client():
+    import httpx
+    from supabase import create_client, ClientOptions
+
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=DB_MAX_CONNECTIONS, max_keepalive_connections=DB_MAX_KEEPALIVE),
+        timeout=httpx.Timeout(DB_TIMEOUT_SECONDS)
+    )
+    try:
+        options = ClientOptions(postgrest_client_timeout=DB_TIMEOUT_SECONDS, httpx_client=http_client)
+    except TypeError:
+        # Older supabase releases can't take a shared httpx client
+        http_client.close()
+        options = ClientOptions(postgrest_client_timeout=DB_TIMEOUT_SECONDS)
+    return create_client(get_env("SUPABASE_URL"), get_env("SUPABASE_KEY"), options=options)
+
+
+def __getattr__(name):
+    # Keep `from database import supabase` working without connecting at import time.
+    if name == "supabase":
+        return get_supabase()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _is_transient(error):
+    """Network errors, timeouts and gateway errors are worth retrying; API errors are not."""
+    import httpx
+
+    if isinstance(error, httpx.TransportError):
+        return True
+    # PGRST000-002: PostgREST could not reach Postgres
+    return str(getattr(error, "code", "")) in ("502", "503", "504", "PGRST000", "PGRST001", "PGRST002")
+
+
+def _execute(name, query, idempotent=False):
+    """
+    Execute a query builder through the circuit breaker.
+    Idempotent calls are retried with jittered backoff while a full attempt
+    (DB_TIMEOUT_SECONDS) still fits before DB_DEADLINE_SECONDS.
+    Raises DatabaseUnavailable for transient failures; other errors propagate as-is.
+    """
+    deadline = time.monotonic() + DB_DEADLINE_SECONDS
+    attempt = 0
+
+    while True:
+        try:
+            breaker.before_call()
+        except CircuitOpenError as e:
+            raise DatabaseUnavailable(str(e)) from e
+
+        started = time.monotonic()
+        _metrics.start()
+        try:
+            response = query.execute()
+        except Exception as e:
+            _metrics.finish(name, "error", time.monotonic() - started)
+            if not _is_transient(e):
+                # Supabase answered, it just said no
+                breaker.record_success()
+                raise
+
+            breaker.record_failure()
+            attempt += 1
+            delay = backoff_delay(attempt)
+            if (not idempotent or attempt > DB_READ_RETRIES
+                    or time.monotonic() + delay + DB_TIMEOUT_SECONDS > deadline):
+                raise DatabaseUnavailable(f"{name} failed: {e}") from e
+
+            print(f"⚠️ {name} failed ({e}), retry {attempt} in {delay:.2f}s")
+            _metrics.retried(name)
+            time.sleep(delay)
+            continue
+
+        _metrics.finish(name, "ok", time.monotonic() - started)
+        breaker.record_success()
+        return response
+
+
+def get_db_metrics():
+    """Connection pool, call and circuit breaker metrics for this process."""
+    return {
+        "pool": {
+            "max_connections": DB_MAX_CONNECTIONS,
+            "max_keepalive_connections": DB_MAX_KEEPALIVE,
+            "timeout_seconds": DB_TIMEOUT_SECONDS,
+            "deadline_seconds": DB_DEADLINE_SECONDS
+        },
+        "breaker": breaker.metrics(),
+        **_metrics.snapshot()
+    }
+
+
+@traced
 def check_student_exists(phone_number):
     """Check if student exists in database."""
     try:
-        response = supabase.table("students").select("*").eq("phone_number", phone_number).execute()
+        response = _execute("check_student_exists", get_supabase().table("students").select("*").eq("phone_number", phone_number), idempotent=True)
         if response.data and len(response.data) > 0:
             return response.data[0]
         return None
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Error checking student: {e}")
         return None
 
 
+@traced
 def get_student_by_phone(phone_number):
     """Get student details by phone number."""
     try:
-        response = supabase.table("students").select("*").eq("phone_number", phone_number).execute()
+        response = _execute("get_student_by_phone", get_supabase().table("students").select("*").eq("phone_number", phone_number), idempotent=True)
         if response.data and len(response.data) > 0:
             return response.data[0]
         return None
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Error getting student: {e}")
         return None
 
 
+@traced
 def register_student(phone_number, college_id, roll_number, student_name, hostel_name, room_number, email=None):
     """Register a new student."""
     try:
@@ -50,12 +215,14 @@ def register_student(phone_number, college_id, roll_number, student_name, hostel
             "is_approved": True
         }
         
-        response = supabase.table("students").insert(data).execute()
+        response = _execute("register_student", get_supabase().table("students").insert(data))
         
         if response.data and len(response.data) > 0:
             print(f"✅ Student registered: {student_name}")
             return response.data[0]
         return None
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Error registering student: {e}")
         import traceback
@@ -63,8 +230,9 @@ def register_student(phone_number, college_id, roll_number, student_name, hostel
         return None
 
 
+@traced
 def create_complaint(student_id, student_phone, student_name, hostel_name, room_number, 
-                    category, priority, raw_message, summary, department_email, confidence):
+                    category, priority, raw_message, summary, department_email, confidence, media=None):
     """Create a new complaint."""
     try:
         resolve_token = str(uuid.uuid4())[:8].upper()
@@ -85,14 +253,20 @@ def create_complaint(student_id, student_phone, student_name, hostel_name, room_
             "resolve_token": resolve_token
         }
         
+        # Photo links (see media.py); stored in a jsonb `media` column
+        if media:
+            data["media"] = media
+        
         print(f"📝 Creating complaint with data: {data}")
         
-        response = supabase.table("complaints").insert(data).execute()
+        response = _execute("create_complaint", get_supabase().table("complaints").insert(data))
         
         if response.data and len(response.data) > 0:
             print(f"✅ Complaint created: {resolve_token}")
             return response.data[0]
         return None
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Error creating complaint: {e}")
         import traceback
@@ -100,67 +274,115 @@ def create_complaint(student_id, student_phone, student_name, hostel_name, room_
         return None
 
 
+@traced
 def get_all_students():
     """Get all students."""
     try:
-        response = supabase.table("students").select("*").order("created_at", desc=True).execute()
+        response = _execute("get_all_students", get_supabase().table("students").select("*").order("created_at", desc=True), idempotent=True)
         return response.data if response.data else []
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Error getting students: {e}")
         return []
 
 
-def get_all_complaints(status=None):
-    """Get all complaints, optionally filtered by status."""
+@traced
+def get_all_complaints(status=None, include_archived=False):
+    """
+    Get all complaints, optionally filtered by status.
+    Only the hot table is read unless include_archived is set (see archive.py).
+    """
     try:
-        query = supabase.table("complaints").select("*")
+        query = get_supabase().table("complaints").select("*")
         
         # Filter by status if provided
         if status:
             query = query.eq("status", status)
         
-        response = query.order("created_at", desc=True).execute()
-        return response.data if response.data else []
+        response = _execute("get_all_complaints", query.order("created_at", desc=True), idempotent=True)
+        complaints = response.data if response.data else []
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Error getting complaints: {e}")
         return []
+    
+    # Outside the try above: an archive problem must surface as an error,
+    # not be mistaken for "no complaints"
+    if include_archived:
+        from archive import get_archived_complaints
+        complaints = complaints + get_archived_complaints(status=status)
+        complaints.sort(key=lambda c: c.get("created_at") or "", reverse=True)
+    
+    return complaints
 
 
+@traced
+def get_resolved_complaints_before(cutoff, limit=500):
+    """Get the oldest complaints resolved before `cutoff` (ISO timestamp)."""
+    response = _execute(
+        "get_resolved_complaints_before",
+        get_supabase().table("complaints").select("*").eq("status", "RESOLVED").lt("resolved_at", cutoff).order("resolved_at").limit(limit),
+        idempotent=True
+    )
+    return response.data if response.data else []
+
+
+@traced
+def delete_complaints(complaint_ids):
+    """Delete complaints by id (used by the archival job)."""
+    if not complaint_ids:
+        return 0
+    response = _execute("delete_complaints", get_supabase().table("complaints").delete().in_("id", complaint_ids), idempotent=True)
+    return len(response.data) if response.data else 0
+
+
+@traced
 def get_dashboard_stats():
     """Get dashboard statistics."""
     try:
         # Get total students
-        students_response = supabase.table("students").select("id", count="exact").execute()
+        students_response = _execute("get_dashboard_stats", get_supabase().table("students").select("id", count="exact"), idempotent=True)
         total_students = students_response.count if students_response.count else 0
         
         # Get total complaints
-        complaints_response = supabase.table("complaints").select("id", count="exact").execute()
+        complaints_response = _execute("get_dashboard_stats", get_supabase().table("complaints").select("id", count="exact"), idempotent=True)
         total_complaints = complaints_response.count if complaints_response.count else 0
         
         # Get pending complaints
-        pending_response = supabase.table("complaints").select("id", count="exact").eq("status", "PENDING").execute()
+        pending_response = _execute("get_dashboard_stats", get_supabase().table("complaints").select("id", count="exact").eq("status", "PENDING"), idempotent=True)
         pending = pending_response.count if pending_response.count else 0
         
         # Get resolved complaints
-        resolved_response = supabase.table("complaints").select("id", count="exact").eq("status", "RESOLVED").execute()
+        resolved_response = _execute("get_dashboard_stats", get_supabase().table("complaints").select("id", count="exact").eq("status", "RESOLVED"), idempotent=True)
         resolved = resolved_response.count if resolved_response.count else 0
         
+        # Archived complaints are all resolved; counted from the archive index, not scanned
+        from archive import archived_count
+        archived = archived_count()
+        
         return {
             "total_students": total_students,
-            "total_complaints": total_complaints,
+            "total_complaints": total_complaints + archived,
             "pending": pending,
-            "resolved": resolved
+            "resolved": resolved + archived,
+            "archived": archived
         }
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Error getting stats: {e}")
         return {
             "total_students": 0,
             "total_complaints": 0,
             "pending": 0,
-            "resolved": 0
+            "resolved": 0,
+            "archived": 0
         }
 
 
+@traced
 def update_complaint_status(complaint_id, status, resolved_by=None, admin_notes=None):
     """Update complaint status."""
     try:
@@ -171,24 +393,262 @@ def update_complaint_status(complaint_id, status, resolved_by=None, admin_notes=
             "admin_notes": admin_notes
         }
         
-        response = supabase.table("complaints").update(data).eq("id", complaint_id).execute()
+        if status == "RESOLVED":
+            # Only the update that actually moves a complaint to RESOLVED feeds the SLA sketches
+            response = _execute(
+                "update_complaint_status",
+                get_supabase().table("complaints").update(data).eq("id", complaint_id).neq("status", "RESOLVED"),
+                idempotent=True
+            )
+            if response.data and len(response.data) > 0:
+                print(f"✅ Complaint status updated: {status}")
+                _record_resolution(response.data[0])
+                return response.data[0]
+        
+        response = _execute("update_complaint_status", get_supabase().table("complaints").update(data).eq("id", complaint_id), idempotent=True)
         
         if response.data and len(response.data) > 0:
             print(f"✅ Complaint status updated: {status}")
             return response.data[0]
         return None
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Error updating complaint: {e}")
         return None
 
 
+def _record_resolution(complaint):
+    try:
+        from sla import record_resolution
+        record_resolution(complaint)
+    except Exception as e:
+        print(f"❌ Error recording resolution time: {e}")
+
+
+def iter_resolved_complaints(page_size=1000):
+    """Yield every resolved complaint in the hot table, one page at a time."""
+    start = 0
+    while True:
+        response = _execute(
+            "iter_resolved_complaints",
+            get_supabase().table("complaints")
+                .select("id, category, hostel_name, department_email, created_at, resolved_at")
+                .eq("status", "RESOLVED")
+                .order("id")
+                .range(start, start + page_size - 1),
+            idempotent=True
+        )
+        rows = response.data or []
+        yield from rows
+        if len(rows) < page_size:
+            return
+        start += page_size
+
+
+@traced
 def get_complaint_by_token(resolve_token):
     """Get complaint by resolve token."""
     try:
-        response = supabase.table("complaints").select("*").eq("resolve_token", resolve_token).execute()
+        response = _execute("get_complaint_by_token", get_supabase().table("complaints").select("*").eq("resolve_token", resolve_token), idempotent=True)
         if response.data and len(response.data) > 0:
             return response.data[0]
         return None
+    except DatabaseUnavailable:
+        raise
     except Exception as e:
         print(f"❌ Error getting complaint by token: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+@traced
+def get_active_admin(username):
+    """Get an active admin by username."""
+    try:
+        response = _execute("get_active_admin", get_supabase().table("admins").select("*").eq("username", username).eq("is_active", True), idempotent=True)
+        if response.data and len(response.data) > 0:
+            return response.data[0]
+        return None
+    except DatabaseUnavailable:
+        raise
+    except Exception as e:
+        # A failed lookup must not look like "no such admin" to callers
+        print(f"❌ Error getting admin: {e}")
+        raise
+
+
+@traced
+def get_active_admin_by_id(admin_id):
+    """Get an active admin by id."""
+    try:
+        response = _execute("get_active_admin_by_id", get_supabase().table("admins").select("*").eq("id", admin_id).eq("is_active", True), idempotent=True)
+        if response.data and len(response.data) > 0:
+            return response.data[0]
+        return None
+    except DatabaseUnavailable:
+        raise
+    except Exception as e:
+        # A failed lookup must not look like "no such admin" to callers
+        print(f"❌ Error getting admin: {e}")
+        raise
+
+
+@traced
+def record_admin_login(admin_id, password_hash=None):
+    """Update last_login, and the stored hash when it was upgraded."""
+    try:
+        data = {"last_login": datetime.utcnow().isoformat()}
+        if password_hash:
+            data["password_hash"] = password_hash
+        _execute("record_admin_login", get_supabase().table("admins").update(data).eq("id", admin_id), idempotent=True)
+        return True
+    except Exception as e:
+        print(f"❌ Error updating admin login: {e}")
+        return False
+
+
+# === BROADCASTS ===
+# Tables:
+#   broadcasts(id, hostel_name, room_from, room_to, message, status, total,
+#              created_by, created_at, finished_at, claimed_by, heartbeat_at)
+#   broadcast_recipients(id, broadcast_id, student_id, phone_number, status,
+#                        message_sid, error, attempts, updated_at)
+
+def _fetch_all(name, build_query, page_size=1000):
+    """Read every row of a query, page by page (PostgREST caps rows per response)."""
+    rows, start = [], 0
+    while True:
+        response = _execute(name, build_query().range(start, start + page_size - 1), idempotent=True)
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+@traced
+def get_students_by_hostel(hostel_name):
+    """Get all students in a hostel."""
+    return _fetch_all(
+        "get_students_by_hostel",
+        lambda: get_supabase().table("students").select("id, phone_number, hostel_name, room_number").eq("hostel_name", hostel_name).order("id")
+    )
+
+
+@traced
+def create_broadcast(hostel_name, room_from, room_to, message, created_by, recipients, batch_size=500):
+    """Create a broadcast job and one PENDING row per recipient."""
+    response = _execute("create_broadcast", get_supabase().table("broadcasts").insert({
+        "hostel_name": hostel_name,
+        "room_from": room_from,
+        "room_to": room_to,
+        "message": message,
+        "status": "PENDING",
+        "total": len(recipients),
+        "created_by": created_by
+    }))
+    broadcast = response.data[0]
+    
+    rows = [
+        {
+            "broadcast_id": broadcast["id"],
+            "student_id": student["id"],
+            "phone_number": student["phone_number"],
+            "status": "PENDING",
+            "attempts": 0
+        }
+        for student in recipients
+    ]
+    try:
+        for start in range(0, len(rows), batch_size):
+            _execute("create_broadcast", get_supabase().table("broadcast_recipients").insert(rows[start:start + batch_size]))
+    except Exception:
+        # A job missing some recipients must never be sent or resumed
+        print(f"❌ Broadcast #{broadcast['id']}: could not create all recipients, marking it FAILED")
+        try:
+            update_broadcast(broadcast["id"], status="FAILED")
+        except Exception as e:
+            print(f"❌ Error marking broadcast #{broadcast['id']} FAILED: {e}")
+        raise
+    
+    return broadcast
+
+
+@traced
+def get_broadcast(broadcast_id):
+    """Get a broadcast job by id."""
+    response = _execute("get_broadcast", get_supabase().table("broadcasts").select("*").eq("id", broadcast_id), idempotent=True)
+    if response.data and len(response.data) > 0:
+        return response.data[0]
+    return None
+
+
+@traced
+def update_broadcast(broadcast_id, **fields):
+    """Update a broadcast job."""
+    _execute("update_broadcast", get_supabase().table("broadcasts").update(fields).eq("id", broadcast_id), idempotent=True)
+
+
+@traced
+def claim_broadcast(broadcast_id, owner, lease_seconds):
+    """
+    Atomically take ownership of a broadcast for sending.
+    Succeeds if nobody is sending it, or the sender's lease has expired.
+    FAILED jobs (recipients never fully created) can't be claimed.
+    """
+    now = datetime.utcnow()
+    expired = (now - timedelta(seconds=lease_seconds)).isoformat()
+    response = _execute(
+        "claim_broadcast",
+        get_supabase().table("broadcasts")
+            .update({"status": "SENDING", "claimed_by": owner, "heartbeat_at": now.isoformat()})
+            .eq("id", broadcast_id)
+            .neq("status", "FAILED")
+            .or_(f"status.neq.SENDING,heartbeat_at.is.null,heartbeat_at.lt.{expired}")
+    )
+    return bool(response.data)
+
+
+@traced
+def renew_broadcast_claim(broadcast_id, owner):
+    """Extend our lease on a broadcast. Returns False if another worker took it over."""
+    response = _execute(
+        "renew_broadcast_claim",
+        get_supabase().table("broadcasts")
+            .update({"heartbeat_at": datetime.utcnow().isoformat()})
+            .eq("id", broadcast_id)
+            .eq("claimed_by", owner)
+            .eq("status", "SENDING"),
+        idempotent=True
+    )
+    return bool(response.data)
+
+
+@traced
+def get_broadcast_recipients(broadcast_id, statuses=("PENDING",)):
+    """Get recipients of a broadcast with the given delivery statuses."""
+    return _fetch_all(
+        "get_broadcast_recipients",
+        lambda: get_supabase().table("broadcast_recipients").select("*").eq("broadcast_id", broadcast_id).in_("status", list(statuses)).order("id")
+    )
+
+
+@traced
+def count_broadcast_recipients(broadcast_id):
+    """Recipient counts per delivery status."""
+    counts = {}
+    for status in ("PENDING", "SENT", "FAILED"):
+        response = _execute(
+            "count_broadcast_recipients",
+            get_supabase().table("broadcast_recipients").select("id", count="exact").eq("broadcast_id", broadcast_id).eq("status", status),
+            idempotent=True
+        )
+        counts[status] = response.count if response.count else 0
+    return counts
+
+
+@traced
+def update_broadcast_recipient(recipient_id, **fields):
+    """Record the delivery state of one recipient."""
+    fields["updated_at"] = datetime.utcnow().isoformat()
+    _execute("update_broadcast_recipient", get_supabase().table("broadcast_recipients").update(fields).eq("id", recipient_id), idempotent=True)
@@ -1,16 +1,37 @@
-import os
-import resend
-from dotenv import load_dotenv
+import threading
 
-load_dotenv()
+from config import get_env
+from profiling import traced
 
-RESEND_API_KEY = os.getenv("RESEND_API_KEY")
-BASE_URL = os.getenv("BASE_URL", "http://localhost:5000")
+_resend = None
+_twilio_client = None
+_client_lock = threading.Lock()
 
-# Configure Resend with API key
-resend.api_key = RESEND_API_KEY
 
+def get_resend():
+    """Return the resend module, importing and configuring it on first use."""
+    global _resend
+    if _resend is None:
+        with _client_lock:
+            if _resend is None:
+                import resend
+                resend.api_key = get_env("RESEND_API_KEY")
+                _resend = resend
+    return _resend
 
+
+def get_twilio_client():
+    """Return the process-wide Twilio REST client, creating it on first use."""
+    global _twilio_client
+    if _twilio_client is None:
+        with _client_lock:
+            if _twilio_client is None:
+                from twilio.rest import Client
+                _twilio_client = Client(get_env("TWILIO_ACCOUNT_SID"), get_env("TWILIO_AUTH_TOKEN"))
+    return _twilio_client
+
+
+@traced
 def send_department_email(complaint):
     """Send email notification to department with complaint details."""
     try:
@@ -19,7 +40,8 @@ def send_department_email(complaint):
         print(f"   To: {complaint.get('department_email')}")
         
         # Create resolve link using BASE_URL from environment
-        resolve_link = f"{BASE_URL}/resolve?token={complaint['resolve_token']}"
+        base_url = get_env("BASE_URL", "http://localhost:5000")
+        resolve_link = f"{base_url}/resolve?token={complaint['resolve_token']}"
         
         # Priority color coding
         priority_colors = {
@@ -30,6 +52,20 @@ def send_department_email(complaint):
         }
         priority_color = priority_colors.get(complaint.get('priority', 'MEDIUM'), "#f59e0b")
         
+        # Photo thumbnails, each linking to the full-size image
+        photos_html = ""
+        if complaint.get('media'):
+            thumbs = "".join(
+                f'<a href="{m["url"]}"><img src="{m["thumbnail_url"]}" alt="Complaint photo" class="photo"></a>'
+                for m in complaint['media']
+            )
+            photos_html = f"""
+                    <div class="info-row">
+                        <div class="info-label">📷 Photos:</div>
+                        <div class="info-value">{thumbs}</div>
+                    </div>
+            """
+        
         # HTML email template
         html_content = f"""
         <!DOCTYPE html>
@@ -48,6 +84,7 @@ def send_department_email(complaint):
                 .message-box {{ background-color: #eff6ff; border: 2px solid #3b82f6; border-radius: 8px; padding: 20px; margin: 20px 0; }}
                 .resolve-button {{ display: inline-block; background: linear-gradient(135deg, #10b981 0%, #059669 100%); color: white; padding: 15px 40px; text-decoration: none; border-radius: 8px; font-weight: bold; font-size: 16px; margin: 20px 0; box-shadow: 0 4px 6px rgba(16, 185, 129, 0.3); }}
                 .resolve-button:hover {{ background: linear-gradient(135deg, #059669 0%, #047857 100%); }}
+                .photo {{ width: 120px; height: 120px; object-fit: cover; border-radius: 6px; margin: 5px 5px 0 0; }}
                 .footer {{ background-color: #f9fafb; padding: 20px; text-align: center; color: #6b7280; font-size: 14px; }}
             </style>
         </head>
@@ -92,7 +129,7 @@ def send_department_email(complaint):
                         <div class="info-label">💬 Issue Description:</div>
                         <div class="info-value" style="margin-top: 10px;">{complaint.get('raw_message', 'No description provided')}</div>
                     </div>
-                    
+                    {photos_html}
                     <div style="text-align: center; margin: 30px 0;">
                         <a href="{resolve_link}" class="resolve-button">
                             ✅ Mark as Resolved
@@ -121,7 +158,7 @@ def send_department_email(complaint):
             "html": html_content
         }
         
-        email = resend.Emails.send(params)
+        email = get_resend().Emails.send(params)
         
         print("✅ EMAIL SENT SUCCESSFULLY")
         print(f"   Email ID: {email.get('id', 'Unknown')}")
@@ -137,17 +174,23 @@ def send_department_email(complaint):
         return False
 
 
+@traced
+def send_whatsapp_message(to, body):
+    """Send one WhatsApp message and return its Twilio SID. Raises on failure."""
+    if not to.startswith("whatsapp:"):
+        to = f"whatsapp:{to}"
+    message = get_twilio_client().messages.create(
+        from_=get_env("TWILIO_WHATSAPP_NUMBER"),
+        body=body,
+        to=to
+    )
+    return message.sid
+
+
+@traced
 def send_whatsapp_notification(complaint):
     """Send WhatsApp notification to student when complaint is resolved."""
     try:
-        from twilio.rest import Client
-        
-        account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-        auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-        twilio_number = os.getenv("TWILIO_WHATSAPP_NUMBER")
-        
-        client = Client(account_sid, auth_token)
-        
         message_body = f"""✅ Great news!
 
 Your complaint #{complaint['resolve_token']} has been RESOLVED!
@@ -158,15 +201,11 @@ Your complaint #{complaint['resolve_token']} has been RESOLVED!
 
 Thank you for reporting! 🎉"""
         
-        message = client.messages.create(
-            from_=twilio_number,
-            body=message_body,
-            to=complaint['student_phone']
-        )
+        sid = send_whatsapp_message(complaint['student_phone'], message_body)
         
-        print(f"✅ WhatsApp notification sent: {message.sid}")
+        print(f"✅ WhatsApp notification sent: {sid}")
         return True
         
     except Exception as e:
         print(f"❌ Failed to send WhatsApp notification: {e}")
-        return False
\ No newline at end of file
+        return False
@@ -52,6 +52,20 @@ export default function ComplaintTable({ complaints, compact = false, onRefresh
                 <span className="text-purple-400 font-mono text-sm font-bold">
                   #{complaint.resolve_token}
                 </span>
+                {complaint.media?.length > 0 && (
+                  <div className="flex space-x-1 mt-2">
+                    {complaint.media.map((photo) => (
+                      <a key={photo.sha256} href={photo.url} target="_blank" rel="noopener noreferrer">
+                        <img
+                          src={photo.thumbnail_url}
+                          alt="Complaint photo"
+                          loading="lazy"
+                          className="w-10 h-10 object-cover rounded border border-gray-600 hover:border-purple-400 transition"
+                        />
+                      </a>
+                    ))}
+                  </div>
+                )}
               </td>
               <td className="py-3 px-4 text-white">{complaint.student_name}</td>
               {!compact && (
@@ -0,0 +1,218 @@
+"""
+Image attachments for WhatsApp complaints.
+
+Twilio sends attachments as NumMedia / MediaUrl{i} / MediaContentType{i}.
+Each image is streamed to disk in chunks while it is hashed, stored once
+under its SHA-256 (so the same photo sent twice is kept once), and
+thumbnailed in a background worker pool off the request path.
+
+Files live under MEDIA_DIR:
+    originals/<sha256>.<ext>
+    thumbs/<sha256>.jpg
+and are served by the /media routes in app.py. Thumbnail URLs carry the
+original's file name, /media/thumbs/<sha256>.<ext>.
+"""
+import hashlib
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import get_env
+
+MEDIA_DIR = get_env("MEDIA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "media"))
+CHUNK_SIZE = 64 * 1024
+MAX_MEDIA_BYTES = int(get_env("MAX_MEDIA_BYTES", 10 * 1024 * 1024))
+MAX_MEDIA_PER_MESSAGE = 5
+# Total time for all downloads on one webhook; Twilio gives up after 15s
+MEDIA_DEADLINE_SECONDS = float(get_env("MEDIA_DEADLINE_SECONDS", 8))
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_WORKERS = int(get_env("THUMBNAIL_WORKERS", 2))
+
+_thumbnail_pool = None
+_pool_lock = threading.Lock()
+_pending_thumbnails = set()
+
+
+class LocalStorage:
+    """Content-addressed media storage on the local filesystem."""
+
+    def __init__(self, root):
+        self.originals_dir = os.path.join(root, "originals")
+        self.thumbs_dir = os.path.join(root, "thumbs")
+        self.tmp_dir = os.path.join(root, "tmp")
+        for directory in (self.originals_dir, self.thumbs_dir, self.tmp_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def original_path(self, name):
+        return os.path.join(self.originals_dir, name)
+
+    def thumbnail_path(self, digest):
+        return os.path.join(self.thumbs_dir, f"{digest}.jpg")
+
+    def save_stream(self, chunks, extension):
+        """
+        Write chunks to a temp file while hashing, then move it into place.
+        Returns (digest, name, is_new).
+        """
+        hasher = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > MAX_MEDIA_BYTES:
+                        raise ValueError(f"Attachment larger than {MAX_MEDIA_BYTES} bytes")
+                    hasher.update(chunk)
+                    f.write(chunk)
+
+            digest = hasher.hexdigest()
+            name = f"{digest}{extension}"
+            final_path = self.original_path(name)
+            if os.path.exists(final_path):
+                os.unlink(tmp_path)
+                return digest, name, False
+
+            os.replace(tmp_path, final_path)
+            return digest, name, True
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+_storage = None
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        _storage = LocalStorage(MEDIA_DIR)
+    return _storage
+
+
+def get_thumbnail_pool():
+    """Return the process-wide thumbnail worker pool."""
+    global _thumbnail_pool
+    if _thumbnail_pool is None:
+        with _pool_lock:
+            if _thumbnail_pool is None:
+                _thumbnail_pool = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+    return _thumbnail_pool
+
+
+def make_thumbnail(digest, name):
+    """Render a JPEG thumbnail for a stored original. Runs in the worker pool."""
+    storage = get_storage()
+    thumb_path = storage.thumbnail_path(digest)
+    try:
+        if os.path.exists(thumb_path):
+            return
+
+        try:
+            from PIL import Image
+        except ImportError:
+            print("⚠️ Pillow not installed, skipping thumbnail")
+            return
+
+        with Image.open(storage.original_path(name)) as image:
+            image.thumbnail(THUMBNAIL_SIZE)
+            tmp_path = f"{thumb_path}.tmp"
+            image.convert("RGB").save(tmp_path, "JPEG", quality=80, optimize=True)
+        os.replace(tmp_path, thumb_path)
+        print(f"🖼️ Thumbnail created: {digest[:12]}")
+    except Exception as e:
+        print(f"❌ Thumbnail error for {name}: {e}")
+    finally:
+        with _pool_lock:
+            _pending_thumbnails.discard(digest)
+
+
+def schedule_thumbnail(digest, name):
+    with _pool_lock:
+        if digest in _pending_thumbnails:
+            return
+        _pending_thumbnails.add(digest)
+    get_thumbnail_pool().submit(make_thumbnail, digest, name)
+
+
+def _until(chunks, deadline):
+    """Pass chunks through, failing once the deadline has passed."""
+    for chunk in chunks:
+        if time.monotonic() > deadline:
+            raise TimeoutError("Media download deadline exceeded")
+        yield chunk
+
+
+def download_media(url, content_type, deadline=None):
+    """
+    Stream one Twilio attachment into storage and queue its thumbnail.
+    `deadline` is a time.monotonic() value the whole download must finish by.
+    """
+    import requests
+
+    if deadline is None:
+        deadline = time.monotonic() + MEDIA_DEADLINE_SECONDS
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("Media download deadline exceeded")
+
+    extension = mimetypes.guess_extension(content_type or "") or ""
+    if extension == ".jpe":
+        extension = ".jpg"
+
+    # Twilio media URLs need account credentials; requests drops them on the
+    # redirect to the CDN host.
+    auth = (get_env("TWILIO_ACCOUNT_SID"), get_env("TWILIO_AUTH_TOKEN"))
+    with requests.get(url, auth=auth, stream=True, timeout=(min(5, remaining), remaining)) as response:
+        response.raise_for_status()
+        chunks = _until(response.iter_content(CHUNK_SIZE), deadline)
+        digest, name, is_new = get_storage().save_stream(chunks, extension)
+
+    if is_new:
+        print(f"📷 Media stored: {name}")
+    else:
+        print(f"📷 Duplicate media, reusing: {name}")
+
+    if not os.path.exists(get_storage().thumbnail_path(digest)):
+        schedule_thumbnail(digest, name)
+
+    base_url = get_env("BASE_URL", "http://localhost:5000")
+    return {
+        "sha256": digest,
+        "content_type": content_type,
+        "url": f"{base_url}/media/{name}",
+        # Named after the original so the thumbs route can fall back to it
+        "thumbnail_url": f"{base_url}/media/thumbs/{name}"
+    }
+
+
+def collect_media(values):
+    """
+    Download every image attachment on an incoming Twilio request.
+    All downloads share one deadline; attachments not fetched by then are skipped.
+    """
+    try:
+        num_media = int(values.get("NumMedia", 0) or 0)
+    except ValueError:
+        return []
+
+    media = []
+    deadline = time.monotonic() + MEDIA_DEADLINE_SECONDS
+    count = min(num_media, MAX_MEDIA_PER_MESSAGE)
+    for i in range(count):
+        if time.monotonic() >= deadline:
+            print(f"⚠️ Media deadline reached, skipping {count - i} attachment(s)")
+            break
+        url = values.get(f"MediaUrl{i}")
+        content_type = values.get(f"MediaContentType{i}", "")
+        if not url or not content_type.startswith("image/"):
+            continue
+        try:
+            media.append(download_media(url, content_type, deadline=deadline))
+        except Exception as e:
+            print(f"❌ Error downloading media {i}: {e}")
+    return media
@@ -0,0 +1,260 @@
+"""
+Opt-in request profiling.
+
+A single background thread samples the stacks of in-flight requests
+(via sys._current_frames) and writes them to PROFILE_DIR as folded
+stacks, one `frame;frame;frame count` line per unique stack. Open them
+with flamegraph.pl or https://www.speedscope.app.
+
+- PROFILING_ENABLED=1 profiles every request.
+- `X-Profile: <PROFILE_TOKEN>` profiles one request (only when
+  PROFILE_TOKEN is set).
+- SLOW_REQUEST_MS=<ms> samples every request at a coarser interval and
+  keeps the profile of any request slower than the threshold.
+
+Only the newest PROFILE_MAX_FILES profiles are kept. The profile id is
+returned in X-Profile-Id only to requests that sent the token.
+
+Functions in database.py and email_sender.py are decorated with
+@traced: their frames show up as `db:<function>` / `email:<function>`
+and their wall time is written next to the profile as spans.
+"""
+import functools
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from config import get_env
+
+PROFILING_ENABLED = get_env("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+PROFILE_TOKEN = get_env("PROFILE_TOKEN")
+PROFILE_HEADER = "X-Profile"
+PROFILE_DIR = get_env("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+SLOW_REQUEST_MS = float(get_env("SLOW_REQUEST_MS", 0))
+PROFILE_INTERVAL_MS = float(get_env("PROFILE_INTERVAL_MS", 5))
+SLOW_SAMPLE_INTERVAL_MS = float(get_env("SLOW_SAMPLE_INTERVAL_MS", 20))
+PROFILE_MAX_FILES = int(get_env("PROFILE_MAX_FILES", 200))
+MAX_STACK_DEPTH = 128
+
+SPAN_PREFIXES = {"database": "db", "email_sender": "email"}
+
+_local = threading.local()
+_active = {}
+_active_lock = threading.Lock()
+_wake = threading.Event()
+_sampler = None
+_labels = {}
+_wrapper_codes = set()
+_prune_lock = threading.Lock()
+
+
+class RequestProfile:
+    """Samples and spans collected for one request."""
+
+    def __init__(self, method, path, interval, forced, requested=False):
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.forced = forced
+        # Asked for with the X-Profile token, so the client may see its id
+        self.requested = requested
+        self.started = time.perf_counter()
+        self.started_at = datetime.utcnow()
+        self.next_sample_at = self.started
+        self.samples = {}
+        self.spans = []
+        # The sampler may still hold this profile after the request ends
+        self._samples_lock = threading.Lock()
+
+    def add_sample(self, stack):
+        with self._samples_lock:
+            self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    def snapshot(self):
+        """A copy of the samples that is safe to iterate while sampling continues."""
+        with self._samples_lock:
+            return dict(self.samples)
+
+
+# === SPANS ===
+
+def traced(fn):
+    """Record the wall time of `fn` as a span when the current request is being profiled."""
+    module = fn.__module__
+    name = f"{SPAN_PREFIXES.get(module, module)}:{fn.__name__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profile = getattr(_local, "profile", None)
+        if profile is None:
+            return fn(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.spans.append({
+                "name": name,
+                "start_ms": round((started - profile.started) * 1000, 2),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2)
+            })
+
+    _wrapper_codes.add(wrapper.__code__)
+    return wrapper
+
+
+# === SAMPLING ===
+
+def _label(code, module):
+    label = _labels.get(code)
+    if label is None:
+        prefix = SPAN_PREFIXES.get(module, module)
+        label = f"{prefix}:{code.co_name}"
+        _labels[code] = label
+    return label
+
+
+def _fold(frame):
+    """frame -> 'root;...;leaf', skipping @traced wrappers."""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        if code not in _wrapper_codes:
+            labels.append(_label(code, frame.f_globals.get("__name__", "?")))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def _sample_loop():
+    while True:
+        with _active_lock:
+            profiles = list(_active.items())
+        if not profiles:
+            _wake.wait()
+            _wake.clear()
+            continue
+
+        frames = sys._current_frames()
+        now = time.perf_counter()
+        for thread_id, profile in profiles:
+            if now < profile.next_sample_at:
+                continue
+            frame = frames.get(thread_id)
+            if frame is not None:
+                profile.add_sample(_fold(frame))
+            profile.next_sample_at = now + profile.interval
+        del frames
+
+        time.sleep(min(profile.interval for _, profile in profiles))
+
+
+def _ensure_sampler():
+    global _sampler
+    if _sampler is None:
+        with _active_lock:
+            if _sampler is None:
+                _sampler = threading.Thread(target=_sample_loop, name="profiler", daemon=True)
+                _sampler.start()
+
+
+def _dump(profile, duration_ms, status_code):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", profile.path).strip("_")[:60] or "root"
+    base = os.path.join(
+        PROFILE_DIR,
+        f"{profile.started_at.strftime('%Y%m%dT%H%M%S%f')}-{profile.method}-{slug}-{int(duration_ms)}ms"
+    )
+
+    samples = profile.snapshot()
+    with open(f"{base}.folded", "w") as f:
+        for stack, count in sorted(samples.items()):
+            f.write(f"{stack} {count}\n")
+
+    with open(f"{base}.json", "w") as f:
+        json.dump({
+            "method": profile.method,
+            "path": profile.path,
+            "status": status_code,
+            "started_at": profile.started_at.isoformat(),
+            "duration_ms": round(duration_ms, 2),
+            "sample_interval_ms": round(profile.interval * 1000, 2),
+            "samples": sum(samples.values()),
+            "reason": "requested" if profile.forced else "slow",
+            "spans": profile.spans
+        }, f, indent=2)
+
+    print(f"🔬 Profile saved: {base}.folded ({duration_ms:.0f} ms, {sum(samples.values())} samples)")
+    _prune()
+    return os.path.basename(base)
+
+
+def _prune():
+    """Delete the oldest profiles beyond PROFILE_MAX_FILES. Names sort by start time."""
+    with _prune_lock:
+        bases = sorted(name[:-len(".folded")] for name in os.listdir(PROFILE_DIR) if name.endswith(".folded"))
+        for base in bases[:max(len(bases) - PROFILE_MAX_FILES, 0)]:
+            for extension in (".folded", ".json"):
+                try:
+                    os.unlink(os.path.join(PROFILE_DIR, base + extension))
+                except FileNotFoundError:
+                    pass
+
+
+# === FLASK HOOKS ===
+
+def init_app(app):
+    """Register the profiling hooks on a Flask app. No-op unless profiling is configured."""
+    if not (PROFILING_ENABLED or PROFILE_TOKEN or SLOW_REQUEST_MS):
+        return
+
+    from flask import request
+
+    @app.before_request
+    def _start_profile():
+        requested = bool(
+            PROFILE_TOKEN and hmac.compare_digest(request.headers.get(PROFILE_HEADER, ""), PROFILE_TOKEN)
+        )
+        forced = PROFILING_ENABLED or requested
+        if not forced and not SLOW_REQUEST_MS:
+            return
+        interval_ms = PROFILE_INTERVAL_MS if forced else SLOW_SAMPLE_INTERVAL_MS
+        profile = RequestProfile(request.method, request.path, interval_ms / 1000, forced, requested)
+        _local.profile = profile
+        _ensure_sampler()
+        with _active_lock:
+            _active[threading.get_ident()] = profile
+        _wake.set()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = getattr(_local, "profile", None)
+        if profile is None:
+            return response
+        _local.profile = None
+        with _active_lock:
+            _active.pop(threading.get_ident(), None)
+
+        duration_ms = (time.perf_counter() - profile.started) * 1000
+        if profile.forced or duration_ms >= SLOW_REQUEST_MS:
+            try:
+                profile_id = _dump(profile, duration_ms, response.status_code)
+                if profile.requested:
+                    response.headers["X-Profile-Id"] = profile_id
+            except Exception as e:
+                # Profiling must never fail the request it measured
+                print(f"❌ Error saving profile: {e}")
+        return response
+
+    @app.teardown_request
+    def _discard_profile(_):
+        # after_request is skipped on unhandled errors
+        if getattr(_local, "profile", None) is not None:
+            _local.profile = None
+            with _active_lock:
+                _active.pop(threading.get_ident(), None)
+
+    print(f"🔬 Profiling on (all requests: {PROFILING_ENABLED}, header: {bool(PROFILE_TOKEN)}, slow > {SLOW_REQUEST_MS or 'off'} ms)")
@@ -0,0 +1,275 @@
+"""
+Resolution-time (SLA) tracking.
+
+Time-to-resolve is kept in mergeable quantile sketches (DDSketch-style
+log-bucketed histograms, 1% relative error) per category, hostel and
+department, plus one overall. They are updated when a complaint moves
+to RESOLVED, and the report served at /api/admin/sla is cached until
+the sketches change; neither depends on how many complaints exist.
+
+Sketches live in SLA_STATE_FILE, shared by all worker processes on the
+host: each update is a locked read-modify-write of the file, and
+readers reload it when it changes. Rebuild it from history (e.g. after
+restoring a backup or first deploying) with:
+
+    python sla.py rebuild
+"""
+import json
+import math
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from config import get_env
+
+SLA_STATE_FILE = get_env("SLA_STATE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sla_state.json"))
+RELATIVE_ACCURACY = 0.01
+QUANTILES = (0.5, 0.9, 0.99)
+DIMENSIONS = (("category", "category"), ("hostel", "hostel_name"), ("department", "department_email"))
+
+
+class QuantileSketch:
+    """Log-bucketed histogram: any quantile is within RELATIVE_ACCURACY of the true value."""
+
+    gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    log_gamma = math.log(gamma)
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        value = max(value, 1.0)  # seconds; anything under a second counts as one
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                # Midpoint of the bucket (gamma^(k-1), gamma^k]
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def merge(self, other):
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def to_dict(self):
+        return {"buckets": {str(k): v for k, v in self.buckets.items()}, "count": self.count,
+                "total": self.total, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls()
+        sketch.buckets = {int(k): v for k, v in data["buckets"].items()}
+        sketch.count, sketch.total = data["count"], data["total"]
+        sketch.min, sketch.max = data["min"], data["max"]
+        return sketch
+
+    def summary(self):
+        hours = lambda seconds: round(seconds / 3600, 2) if seconds is not None else None
+        result = {"count": self.count, "mean_hours": hours(self.total / self.count) if self.count else None,
+                  "max_hours": hours(self.max)}
+        for q in QUANTILES:
+            result[f"p{int(q * 100)}_hours"] = hours(self.quantile(q))
+        return result
+
+
+def _parse_time(value):
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # resolved_at is written as naive UTC (see update_complaint_status)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def resolution_seconds(complaint):
+    """Seconds from creation to resolution, or None if not resolved."""
+    if not complaint.get("created_at") or not complaint.get("resolved_at"):
+        return None
+    return (_parse_time(complaint["resolved_at"]) - _parse_time(complaint["created_at"])).total_seconds()
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock across worker processes (no-op where fcntl is unavailable)."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class SLATracker:
+    """
+    Resolution-time sketches per dimension, with a cached report.
+
+    The state file is the source of truth: updates re-read it, add the
+    sample and write it back under a file lock, and reads reload it
+    whenever another process (or the rebuild CLI) has replaced it.
+    """
+
+    def __init__(self, state_file=SLA_STATE_FILE):
+        self.state_file = state_file
+        self.lock_file = f"{state_file}.lock"
+        self.overall = QuantileSketch()
+        self.sketches = {name: {} for name, _ in DIMENSIONS}
+        self.updated_at = None
+        self._report = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.state_file)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        """Reload the state file if it changed since we last read or wrote it."""
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+
+        overall, sketches, updated_at = QuantileSketch(), {name: {} for name, _ in DIMENSIONS}, None
+        if signature is not None:
+            try:
+                with open(self.state_file) as f:
+                    state = json.load(f)
+                overall = QuantileSketch.from_dict(state["overall"])
+                sketches = {
+                    name: {value: QuantileSketch.from_dict(s) for value, s in state["sketches"].get(name, {}).items()}
+                    for name, _ in DIMENSIONS
+                }
+                updated_at = state.get("updated_at")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"❌ Error loading SLA state, starting empty: {e}")
+
+        self.overall, self.sketches, self.updated_at = overall, sketches, updated_at
+        self._signature = signature
+        self._report = None
+
+    def _add(self, complaint, seconds):
+        self.overall.add(seconds)
+        for name, field in DIMENSIONS:
+            value = complaint.get(field) or "UNKNOWN"
+            self.sketches[name].setdefault(value, QuantileSketch()).add(seconds)
+
+    def record(self, complaint):
+        """Add one resolved complaint's time-to-resolve to the shared state."""
+        seconds = resolution_seconds(complaint)
+        if seconds is None or seconds < 0:
+            return
+        with self._lock, _file_lock(self.lock_file):
+            self._refresh()
+            self._add(complaint, seconds)
+            self.updated_at = datetime.utcnow().isoformat()
+            self._report = None
+            self._save()
+
+    def rebuild(self, complaints):
+        """
+        Replace all sketches from an iterable of complaints, in one pass.
+        Resolutions recorded while the pass runs are picked up by the next rebuild.
+        """
+        tracker = SLATracker(self.state_file)
+        count = 0
+        for complaint in complaints:
+            seconds = resolution_seconds(complaint)
+            if seconds is not None and seconds >= 0:
+                tracker._add(complaint, seconds)
+                count += 1
+
+        with self._lock, _file_lock(self.lock_file):
+            self.overall, self.sketches = tracker.overall, tracker.sketches
+            self.updated_at = datetime.utcnow().isoformat()
+            self._report = None
+            self._save()
+        return count
+
+    def report(self):
+        with self._lock:
+            self._refresh()
+            if self._report is None:
+                self._report = {
+                    "overall": self.overall.summary(),
+                    **{name: {value: s.summary() for value, s in sorted(sketches.items())}
+                       for name, sketches in self.sketches.items()},
+                    "updated_at": self.updated_at,
+                    "relative_accuracy": RELATIVE_ACCURACY
+                }
+            return self._report
+
+    def _save(self):
+        state = {
+            "overall": self.overall.to_dict(),
+            "sketches": {name: {value: s.to_dict() for value, s in sketches.items()} for name, sketches in self.sketches.items()},
+            "updated_at": self.updated_at
+        }
+        try:
+            tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_file)
+            self._signature = self._file_signature()
+        except OSError as e:
+            print(f"❌ Error saving SLA state: {e}")
+
+
+tracker = SLATracker()
+
+
+def record_resolution(complaint):
+    tracker.record(complaint)
+
+
+def get_sla_report():
+    return tracker.report()
+
+
+def rebuild_from_history():
+    """Stream every resolved complaint (hot table and archive) into fresh sketches."""
+    from archive import iter_archived
+    from database import iter_resolved_complaints
+
+    def history():
+        yield from iter_resolved_complaints()
+        yield from iter_archived()
+
+    count = tracker.rebuild(history())
+    print(f"✅ Rebuilt SLA sketches from {count} resolved complaint(s)")
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        sys.exit("Usage: python sla.py rebuild")
+    rebuild_from_history()
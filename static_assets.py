@@ -0,0 +1,172 @@
+"""
+Serve the React build from an in-memory index.
+
+The build directory is scanned once at startup (driven by
+asset-manifest.json), so requests never touch the filesystem to decide
+what to serve. Hashed bundles get an immutable one-year Cache-Control,
+precompressed .br/.gz siblings are used when the client accepts them,
+and index.html is revalidated with an ETag on every visit.
+
+Run `python static_assets.py precompress [build_dir]` after `npm run build`
+to generate the .gz (and .br, if the brotli package is installed) files.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+
+from flask import request, send_file
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+SHORT_CACHE_CONTROL = "public, max-age=3600"
+
+# CRA names bundles like main.9d345200.js / 213.65a16049.chunk.js
+HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.")
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+COMPRESSIBLE_TYPES = (".js", ".css", ".html", ".json", ".map", ".svg", ".txt", ".ico")
+
+
+class Asset:
+    """A single file in the build directory."""
+
+    __slots__ = ("path", "mimetype", "etag", "cache_control", "variants")
+
+    def __init__(self, path, mimetype, etag, cache_control, variants):
+        self.path = path
+        self.mimetype = mimetype
+        self.etag = etag
+        self.cache_control = cache_control
+        self.variants = variants
+
+
+class AssetIndex:
+    """Index of every servable file under the React build directory."""
+
+    def __init__(self, build_dir):
+        self.build_dir = build_dir
+        self.assets = {}
+        self.reload()
+
+    def reload(self):
+        """Rescan the build directory and swap in a fresh index."""
+        hashed = self._manifest_paths()
+        assets = {}
+
+        for root, _, files in os.walk(self.build_dir):
+            names = set(files)
+            for name in files:
+                if name.endswith((".br", ".gz")) and name[:-3] in names:
+                    continue
+
+                full_path = os.path.join(root, name)
+                url_path = os.path.relpath(full_path, self.build_dir).replace(os.sep, "/")
+
+                if url_path == "index.html":
+                    cache_control = REVALIDATE_CACHE_CONTROL
+                elif url_path in hashed or (url_path.startswith("static/") and HASHED_NAME.search(name)):
+                    cache_control = IMMUTABLE_CACHE_CONTROL
+                else:
+                    cache_control = SHORT_CACHE_CONTROL
+
+                variants = [
+                    (encoding, f"{full_path}{suffix}")
+                    for encoding, suffix in ENCODINGS
+                    if f"{name}{suffix}" in names
+                ]
+
+                assets[url_path] = Asset(
+                    path=full_path,
+                    mimetype=mimetypes.guess_type(name)[0] or "application/octet-stream",
+                    etag=_file_etag(full_path),
+                    cache_control=cache_control,
+                    variants=variants,
+                )
+
+        self.assets = assets
+        print(f"📦 Indexed {len(assets)} build assets from {self.build_dir}")
+
+    def _manifest_paths(self):
+        """Return the hashed file paths listed in asset-manifest.json."""
+        manifest_path = os.path.join(self.build_dir, "asset-manifest.json")
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return set()
+
+        paths = {p.lstrip("/") for p in manifest.get("files", {}).values()}
+        paths.update(p.lstrip("/") for p in manifest.get("entrypoints", []))
+        paths.discard("index.html")
+        return paths
+
+    def __contains__(self, path):
+        return path in self.assets
+
+    def serve(self, path):
+        """Build a response for an indexed asset, or return None if it is not in the build."""
+        asset = self.assets.get(path)
+        if asset is None:
+            return None
+
+        file_path, etag, encoding = asset.path, asset.etag, None
+        for candidate, variant_path in asset.variants:
+            if request.accept_encodings[candidate]:
+                file_path, etag, encoding = variant_path, f"{asset.etag}-{candidate}", candidate
+                break
+
+        response = send_file(file_path, mimetype=asset.mimetype, etag=etag, conditional=True)
+        response.headers["Cache-Control"] = asset.cache_control
+        if asset.variants:
+            response.vary.add("Accept-Encoding")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        return response
+
+
+def _file_etag(path):
+    """Content hash of a file, so ETags survive redeploys of identical builds."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def precompress(build_dir):
+    """Write .gz (and .br when brotli is installed) next to every compressible file."""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        print("⚠️ brotli not installed, writing .gz only")
+
+    count = 0
+    for root, _, files in os.walk(build_dir):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE_TYPES):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+
+            with open(f"{path}.gz", "wb") as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(f"{path}.br", "wb") as f:
+                    f.write(brotli.compress(data, quality=11))
+            count += 1
+
+    print(f"✅ Precompressed {count} files in {build_dir}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "precompress":
+        sys.exit("Usage: python static_assets.py precompress [build_dir]")
+    precompress(sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "build"))
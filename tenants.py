@@ -0,0 +1,173 @@
+"""
+Multi-campus routing.
+
+Each campus (tenant) owns one or more Twilio WhatsApp numbers. Incoming
+messages are routed by the webhook's `To` number to that tenant's
+department directory, category keywords and hostel-name patterns.
+
+Tenants are read from tenants.json (or TENANTS_FILE); see
+tenants.example.json. The file is re-checked every few seconds and
+re-read when it changes, so a campus can be added without a restart.
+Without the file every number maps to the built-in default rules.
+"""
+import json
+import os
+import threading
+import time
+
+from ai_classifier import Classifier, active_rules, check_department_emails, compile_keywords
+from config import get_env
+
+DEFAULT_TENANT_ID = "default"
+RELOAD_CHECK_SECONDS = 5
+
+
+class Tenant:
+    """A campus and its compiled classifier."""
+
+    def __init__(self, tenant_id, name, whatsapp_numbers, classifier):
+        self.id = tenant_id
+        self.name = name
+        self.whatsapp_numbers = whatsapp_numbers
+        self.classifier = classifier
+
+
+def normalize_number(number):
+    """Twilio sends `whatsapp:+14155238886`; accept either form in config."""
+    number = (number or "").strip()
+    if number.startswith("whatsapp:"):
+        number = number[len("whatsapp:"):]
+    if number and not number.startswith("+"):
+        number = f"+{number}"
+    return number
+
+
+class TenantRegistry:
+    """Maps WhatsApp numbers to tenants, reloading the config file when it changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.default_tenant = None
+        self._by_number = {}
+        self._tenants = {}
+        self._classifier_cache = {}
+        self._mtime = None
+        self._rules = None
+        self._cache_rules = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def for_number(self, to_number):
+        """Return the tenant that owns `to_number`, or the default tenant."""
+        self._maybe_reload()
+        return self._by_number.get(normalize_number(to_number), self.default_tenant)
+
+    def get(self, tenant_id):
+        self._maybe_reload()
+        if tenant_id == DEFAULT_TENANT_ID:
+            return self.default_tenant
+        return self._tenants.get(tenant_id)
+
+    def all(self):
+        self._maybe_reload()
+        return list(self._tenants.values())
+
+    def _maybe_reload(self):
+        # Tenant rules extend the base classifier rules, so recompile when those change too
+        rules = active_rules()
+        now = time.monotonic()
+        if rules is self._rules and now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return
+        with self._lock:
+            if rules is self._rules and now - self._checked_at < RELOAD_CHECK_SECONDS:
+                return
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                mtime = None
+            if mtime != self._mtime or rules is not self._rules:
+                self._load(rules)
+                self._mtime = mtime
+
+    def reload(self):
+        """Force a re-read of the tenants file."""
+        with self._lock:
+            self._load(active_rules())
+            self._checked_at = time.monotonic()
+
+    def _load(self, rules):
+        self.default_tenant = Tenant(DEFAULT_TENANT_ID, "Default", [], rules.classifier)
+        # Recorded even if the file is bad, so _maybe_reload keeps its check interval
+        self._rules = rules
+        try:
+            with open(self.path) as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            config = {}
+        except (OSError, ValueError) as e:
+            # Keep serving the last good config
+            print(f"❌ Error loading tenants from {self.path}: {e}")
+            return
+
+        # Cached tenant classifiers were built on top of a specific rules snapshot
+        if rules is not self._cache_rules:
+            self._classifier_cache = {}
+            self._cache_rules = rules
+
+        tenant_configs = config.get("tenants", {}) if isinstance(config, dict) else None
+        if not isinstance(tenant_configs, dict):
+            print(f"❌ Error loading tenants from {self.path}: \"tenants\" must be an object")
+            return
+
+        tenants, by_number, cache = {}, {}, {}
+        for tenant_id, tenant_config in tenant_configs.items():
+            try:
+                classifier = self._compile(tenant_config, rules)
+                numbers = [normalize_number(n) for n in tenant_config.get("whatsapp_numbers", [])]
+                tenant = Tenant(tenant_id, tenant_config.get("name", tenant_id), numbers, classifier)
+                cache[_rules_key(tenant_config)] = classifier
+            except (AttributeError, TypeError, ValueError) as e:
+                # One bad campus must not take routing down for the rest
+                tenant = self._tenants.get(tenant_id)
+                print(f"❌ Error loading tenant {tenant_id}, {'keeping last good config' if tenant else 'skipping'}: {e}")
+                if tenant is None:
+                    continue
+
+            tenants[tenant_id] = tenant
+            for number in tenant.whatsapp_numbers:
+                by_number[number] = tenant
+
+        self._tenants, self._by_number, self._classifier_cache = tenants, by_number, cache
+        print(f"🏢 Loaded {len(tenants)} tenant(s) from {self.path}")
+
+    def _compile(self, tenant_config, rules):
+        """Reuse the compiled classifier when a tenant's rules did not change."""
+        cached = self._classifier_cache.get(_rules_key(tenant_config))
+        if cached is not None:
+            return cached
+
+        base = rules.classifier
+        priority_keywords = compile_keywords(tenant_config.get("priority_keywords"), "priority_keywords")
+        department_emails = check_department_emails(tenant_config.get("department_emails"))
+        hostel_patterns = tenant_config.get("hostel_patterns")
+
+        # Tenant keywords extend/override the active rules per category;
+        # anything a tenant leaves out comes from the active rules too
+        category_keywords = dict(base.category_keywords)
+        category_keywords.update(compile_keywords(tenant_config.get("category_keywords"), "category_keywords") or {})
+
+        return Classifier(
+            category_keywords=category_keywords,
+            department_emails=base.department_emails if department_emails is None else department_emails,
+            hostel_patterns=[p.pattern for p in base.hostel_patterns] if hostel_patterns is None else hostel_patterns,
+            priority_keywords=base.priority_keywords if priority_keywords is None else priority_keywords,
+        )
+
+
+def _rules_key(tenant_config):
+    rules = {k: tenant_config.get(k) for k in ("category_keywords", "department_emails", "hostel_patterns", "priority_keywords")}
+    return json.dumps(rules, sort_keys=True)
+
+
+tenants = TenantRegistry(get_env("TENANTS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tenants.json")))